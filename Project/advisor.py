@@ -0,0 +1,159 @@
+# advisor.py
+# Monte Carlo "best next shot" service. Worker processes sample enemy fleet
+# layouts that agree with every hit, miss and sinking so far, and count how
+# often each unshot cell is covered. The ranking is returned as soon as the top
+# cells stop changing, or when the time budget runs out.
+#
+# Each advise call takes its own generation by bumping a counter the workers
+# share, and bumps it again when it returns if no newer call has. Jobs whose
+# generation is no longer current give up within CHECK_EVERY layouts, so a late
+# job never holds a worker past the call that wanted it. If calls overlap, the
+# newest one wins: the older one's board is out of date anyway.
+#
+#   python3 advisor.py      # advise on an opening board and print timings
+
+import os
+import sys
+import time
+import random
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from board import iter_bits
+from placements import get_index
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+ADVICE_BUDGET = 0.5     # seconds
+SAMPLES_PER_JOB = 2000  # layouts attempted per worker job
+TOP_K = 3               # ranking must keep these cells in this order...
+STABLE_ROUNDS = 4       # ...for this many finished jobs in a row
+CHECK_EVERY = 64        # layouts a worker tries between looks at the generation counter
+
+_generation = None      # worker side: the advisor's shared generation counter
+
+def _init_worker(generation):
+    global _generation
+    _generation = generation
+
+def sample_counts(grid_size, fleet, hits, misses, attempts, seed, sunk=0, generation=None):
+    """Worker: try `attempts` random layouts, keep the ones that avoid every
+    miss, cover every hit and fit the sinkings: a ship is fully hit exactly
+    when one of its cells is in `sunk`, the shots that came back SUNK. Stops
+    early once the advisor moves past `generation`. Returns (per-cell cover
+    counts, layouts kept)."""
+    rng = random.Random(seed)
+    index = get_index(grid_size, fleet)
+    choices = []
+    for length in fleet:
+        first, end = index.span(length)
+        choices.append([m for m in (index.mask(r) for r in range(first, end)) if not (m & misses)])
+    counts = [0] * (grid_size * grid_size)
+    kept = 0
+    if not all(choices): return counts, 0
+    for attempt in range(attempts):
+        if generation is not None and attempt % CHECK_EVERY == 0 and _generation.value != generation: break
+        layout = 0
+        ships = []
+        for options in choices:
+            m = options[rng.randrange(len(options))]
+            if m & layout: break
+            layout |= m
+            ships.append(m)
+        else:
+            if hits & ~layout: continue
+            if sunk and not fits_sinkings(ships, hits, sunk): continue
+            kept += 1
+            for c in iter_bits(layout & ~hits):
+                counts[c] += 1
+    return counts, kept
+
+def fits_sinkings(ships, hits, sunk):
+    """Whether every ship is fully hit exactly when one of its cells came back SUNK"""
+    for m in ships:
+        s = m & sunk
+        if bool(m & ~hits) == bool(s) or s & (s - 1): return False
+    return True
+
+class ShotAdvisor:
+    def __init__(self, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, workers=None):
+        self.grid_size = grid_size
+        self.fleet = list(fleet)
+        self.workers = workers or os.cpu_count() or 1
+        self.generation = multiprocessing.Value("q", 0, lock=False)
+        self.generation_lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.generation,))
+        self.rng = random.Random()
+        get_index(grid_size, fleet)  # make sure the disk cache exists before workers map it
+
+    def advise(self, hits, misses, pending=0, sunk=0, budget=ADVICE_BUDGET):
+        """Rank unshot cells for a tracking board (hits / misses / pending /
+        sinks bitmasks). Returns (best coord or None, per-cell counts, layouts
+        sampled)."""
+        cells = self.grid_size * self.grid_size
+        shot = hits | misses | pending
+        deadline = time.monotonic() + budget
+        counts = [0] * cells
+        kept = 0
+        last_top, stable = None, 0
+        with self.generation_lock:
+            self.generation.value += 1
+            generation = self.generation.value
+
+        def submit():
+            return self.pool.submit(sample_counts, self.grid_size, self.fleet, hits, misses,
+                                    SAMPLES_PER_JOB, self.rng.getrandbits(64), sunk, generation)
+
+        running = {submit() for _ in range(self.workers)}
+        while running:
+            done, running = wait(running, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            for f in done:
+                job_counts, job_kept = f.result()
+                kept += job_kept
+                for c, v in enumerate(job_counts): counts[c] += v
+                top = tuple(sorted((c for c in range(cells) if not shot >> c & 1), key=lambda c: -counts[c])[:TOP_K])
+                stable = stable + 1 if kept and top == last_top else 0
+                last_top = top
+            if stable >= STABLE_ROUNDS or time.monotonic() >= deadline: break
+            running |= {submit() for _ in done}
+        # jobs still queued never start, and running ones give up at their next check
+        with self.generation_lock:
+            if self.generation.value == generation: self.generation.value += 1
+        for f in running: f.cancel()
+
+        open_cells = [c for c in range(cells) if not shot >> c & 1]
+        if not open_cells: return None, counts, kept
+        best = max(open_cells, key=lambda c: counts[c])
+        return (best % self.grid_size, best // self.grid_size), counts, kept
+
+    def start(self, hits, misses, pending=0, sunk=0, budget=ADVICE_BUDGET):
+        """Run advise on a background thread. Poll the returned job's .ready
+        Event and read .result (the advise tuple) once it is set."""
+        job = AdviceJob()
+        def run():
+            try: job.result = self.advise(hits, misses, pending, sunk, budget)
+            except Exception as e: print(f"ADVISOR: {e}")
+            job.ready.set()
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class AdviceJob:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.result = None
+
+if __name__ == "__main__":
+    grid = int(sys.argv[1]) if len(sys.argv) > 1 else GRID_SIZE
+    advisor = ShotAdvisor(grid)
+    cell = 1 << (2 * grid + 2)
+    for label, hits, misses, sunk in (("opening", 0, 0, 0), ("one hit at (2, 2)", cell, 0, 0),
+                                      ("(1, 2) then (2, 2) sank a ship", cell | cell >> 1, 0, cell)):
+        start = time.perf_counter()
+        best, counts, kept = advisor.advise(hits, misses, sunk=sunk, budget=2.0)
+        print(f"{label}: best {best} from {kept} layouts in {time.perf_counter() - start:.3f}s on {advisor.workers} workers")
+    advisor.shutdown()
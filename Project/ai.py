@@ -0,0 +1,242 @@
+# ai.py
+# Computer opponents for the headless engine (and anything else that can feed
+# them SHOT_RESULTs).
+#
+# EndgamePlayer is a DensityPlayer that opens from the precomputed book in
+# opening_book.py and switches to the exact solver in endgame.py once few
+# enough enemy layouts remain. The gain is small: firing at the same fleets
+# with ENDGAME_NODES per solve, it needs 0.13 +- 0.05 fewer shots than
+# DensityPlayer on 5x5 [3,2] (3000 fleets, 11.49 vs 11.62) and 0.21 +- 0.06
+# fewer on 6x6 [3,3,2] (1000 fleets). Games against random are too noisy to
+# show it.
+#
+# HuntPlayer fires at random until it hits, then works outwards from the hit.
+# It only remembers the cells it has shot, so it is the one to use on boards
+# too big for the placement index (large-board mode).
+#
+# DensityPlayer keeps, for every cell, how many still-possible placements of
+# the remaining fleet cover it. Each SHOT_RESULT only touches the placements
+# that cover the shot cell, so picking a shot is one argmax over the grid no
+# matter how big the board is.
+#
+#   python3 ai.py [games]       # each player vs random, then endgame vs density on the same fleets
+
+import sys
+import time
+import random
+import statistics
+
+import numpy as np
+
+from board import Board
+from engine import Player, RandomPlayer, random_fleet, play_match
+from placements import get_index
+from endgame import get_solver, ENDGAME_NODES
+from opening_book import get_book
+
+TARGET_WEIGHT = 50  # how much a placement through an unsunk hit outweighs a blind one
+
+class HuntPlayer(Player):
+    name = "hunt"
+
+    def new_game(self, width, height, fleet, rng):
+        super().new_game(width, height, fleet, rng)
+        self.shot = set()
+        self.around = []                # cells next to a hit, tried before random ones
+
+    def place_ships(self, board):
+        random_fleet(board, self.fleet, self.rng)
+
+    def choose_shot(self):
+        while self.around:
+            coord = self.around.pop()
+            if coord not in self.shot: break
+        else:
+            coord = (self.rng.randrange(self.width), self.rng.randrange(self.height))
+            while coord in self.shot:
+                coord = (self.rng.randrange(self.width), self.rng.randrange(self.height))
+        self.shot.add(coord)
+        return coord
+
+    def shot_result(self, coord, result):
+        if result != "HIT": return
+        x, y = coord
+        for n in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= n[0] < self.width and 0 <= n[1] < self.height and n not in self.shot:
+                self.around.append(n)
+
+class DensityPlayer(Player):
+    name = "density"
+
+    def new_game(self, width, height, fleet, rng):
+        super().new_game(width, height, fleet, rng)
+        cells = width * height
+        self.shot = np.zeros(cells, dtype=bool)
+        self.open_hits = set()          # hit cells not yet attributed to a sunk ship
+        self.base = np.zeros(cells, dtype=np.int64)
+        self.target = np.zeros(cells, dtype=np.int64)
+        self.count = {}                 # length -> ships of that length still afloat
+        self.starts = {}                # length -> (P, length) cell indices per placement
+        self.alive = {}
+        self.hitcount = {}
+        index = get_index(width, fleet)
+        for length in fleet:
+            self.count[length] = self.count.get(length, 0) + 1
+        for length in self.count:
+            cells_of = index.cells_of(length)
+            self.starts[length] = cells_of
+            self.alive[length] = np.ones(len(cells_of), dtype=bool)
+            self.hitcount[length] = np.zeros(len(cells_of), dtype=np.int64)
+            self.base += np.bincount(cells_of.ravel(), minlength=cells) * self.count[length]
+
+    def _covering(self, length, cell):
+        """Indices of placements of this length that cover cell. Relies on the
+        placements.py row order: horizontal starts row-major, then vertical."""
+        w, h = self.width, self.height
+        x, y = cell % w, cell // w
+        n_horiz = max(w - length + 1, 0) * h
+        out = []
+        for x0 in range(max(x - length + 1, 0), min(x, w - length) + 1):
+            out.append(y * (w - length + 1) + x0)
+        for y0 in range(max(y - length + 1, 0), min(y, h - length) + 1):
+            out.append(n_horiz + y0 * w + x)
+        return np.array(out, dtype=np.intp)
+
+    def _kill(self, length, idx):
+        idx = idx[self.alive[length][idx]]
+        if not len(idx): return
+        self.alive[length][idx] = False
+        cells = self.starts[length][idx]
+        n = self.count[length]
+        np.subtract.at(self.base, cells.ravel(), n)
+        weights = np.repeat(self.hitcount[length][idx] * n, length)
+        np.subtract.at(self.target, cells.ravel(), weights)
+
+    def place_ships(self, board):
+        random_fleet(board, self.fleet, self.rng)
+
+    def choose_shot(self):
+        score = self.base + TARGET_WEIGHT * self.target
+        score[self.shot] = -1
+        best = np.flatnonzero(score == score.max())
+        cell = int(best[self.rng.randrange(len(best))])
+        return (cell % self.width, cell // self.width)
+
+    def choose_salvo(self, k):
+        score = self.base + TARGET_WEIGHT * self.target
+        score[self.shot] = -1
+        cells = np.argsort(-score, kind="stable")[:k]
+        return [(int(c) % self.width, int(c) // self.width) for c in cells if score[c] >= 0]
+
+    def shot_result(self, coord, result):
+        cell = coord[1] * self.width + coord[0]
+        self.shot[cell] = True
+        if result == "MISS":
+            for length in self.count:
+                self._kill(length, self._covering(length, cell))
+            return
+        self.open_hits.add(cell)
+        for length, n in self.count.items():
+            idx = self._covering(length, cell)
+            idx = idx[self.alive[length][idx]]
+            self.hitcount[length][idx] += 1
+            np.add.at(self.target, self.starts[length][idx].ravel(), n)
+        if result == "SUNK":
+            self._resolve_sunk(cell)
+
+    def _resolve_sunk(self, cell):
+        # The protocol doesn't say which ship sank, so take the longest afloat
+        # ship that fits entirely on open hits through this cell.
+        sunk_cells, sunk_length = [cell], None
+        for length in sorted(self.count, reverse=True):
+            if not self.count[length]: continue
+            idx = self._covering(length, cell)
+            for p in idx[self.alive[length][idx]]:
+                cells = self.starts[length][p]
+                if all(int(c) in self.open_hits for c in cells):
+                    sunk_cells, sunk_length = [int(c) for c in cells], length
+                    break
+            if sunk_length: break
+
+        for c in sunk_cells:
+            self.open_hits.discard(c)
+            for length in self.count:
+                idx = self._covering(length, c)
+                live = idx[self.alive[length][idx]]
+                self.hitcount[length][live] -= 1
+                np.subtract.at(self.target, self.starts[length][live].ravel(), self.count[length])
+                self._kill(length, idx)
+
+        if sunk_length:
+            # One fewer ship of this length: drop one unit of its weight everywhere.
+            live = np.flatnonzero(self.alive[sunk_length])
+            cells = self.starts[sunk_length][live]
+            np.subtract.at(self.base, cells.ravel(), 1)
+            np.subtract.at(self.target, cells.ravel(), np.repeat(self.hitcount[sunk_length][live], sunk_length))
+            self.count[sunk_length] -= 1
+
+class EndgamePlayer(DensityPlayer):
+    name = "endgame"
+
+    def __init__(self, wait_for_solver=True, nodes=None):
+        self.wait_for_solver = wait_for_solver  # False: play on the density heuristic until it is built
+        self.nodes = nodes                      # work units per solve instead of ENDGAME_BUDGET, for repeatable games
+
+    def new_game(self, width, height, fleet, rng):
+        super().new_game(width, height, fleet, rng)
+        self.solver = get_solver(width, fleet, self.wait_for_solver)
+        self.book = get_book(width, fleet) if width == height else None
+        self.book_node = 0 if self.book else None
+        self.hits = self.misses = 0
+        self.history = []
+
+    def choose_shot(self):
+        if self.book_node is not None:
+            move = self.book.shot(self.book_node)
+            if move: return move
+        if self.nodes: solved = self.solver.best_shot(self.hits, self.misses, self.history, budget=None, nodes=self.nodes)
+        else: solved = self.solver.best_shot(self.hits, self.misses, self.history)
+        if solved: return solved[0]
+        return super().choose_shot()
+
+    def shot_result(self, coord, result):
+        super().shot_result(coord, result)
+        self.history.append((tuple(coord), result))
+        if self.book_node is not None:
+            self.book_node = self.book.child(self.book_node, coord, result)
+        b = 1 << (coord[1] * self.width + coord[0])
+        if result == "MISS": self.misses |= b
+        else: self.hits |= b
+
+def shots_to_sink(player, seed, grid_size=5, fleet=(3, 2)):
+    """Shots player needs to sink a fleet placed from seed, firing alone"""
+    target = random_fleet(Board(grid_size), fleet, random.Random(seed))
+    player.new_game(grid_size, grid_size, fleet, random.Random(seed + 1))
+    shots = 0
+    while True:
+        coord = tuple(player.choose_shot())
+        shots += 1
+        result = target.receive_shot(coord)
+        player.shot_result(coord, result)
+        if result == "ALL_SUNK": return shots
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = random.Random(0)
+    for player in (HuntPlayer(), DensityPlayer(), EndgamePlayer()):
+        players = [player, RandomPlayer()]
+        wins, turns = 0, 0
+        start = time.perf_counter()
+        for g in range(games):
+            first = g % 2
+            result = play_match(players, rng=rng, first=first)
+            wins += result["winner"] == 0
+            turns += result["turns"] if result["winner"] == 0 else 0
+        elapsed = time.perf_counter() - start
+        print(f"{player.name} beat random {wins}/{games} ({elapsed / games * 1000:.2f} ms/game), "
+              f"avg winning turn {turns / max(wins, 1):.2f}")
+    # Paired: both players fire at the same fleets, so the fleet luck cancels out
+    saved = [shots_to_sink(DensityPlayer(), seed) - shots_to_sink(EndgamePlayer(nodes=ENDGAME_NODES), seed)
+             for seed in range(games)]
+    print(f"endgame needs {statistics.mean(saved):.3f} +- {statistics.stdev(saved) / games ** 0.5:.3f} "
+          f"fewer shots than density on the same {games} fleets")
@@ -0,0 +1,133 @@
+# analytics.py
+# Shot and placement heatmaps over recorded games (replay.py logs). Each log is
+# memory-mapped as a NumPy record array and reduced in one vectorized pass:
+# game ids come from a cumulative sum over GAME_START records, and every
+# heatmap is a single bincount. Nothing loops over games or records in Python.
+# A resumed game (a RESUME record, or a turn replayed after a crash) can log a
+# shot or placement twice, so each one counts once per game.
+#
+# Heatmaps, each (2, cells) indexed by side (OURS, THEIRS) except placements:
+#   shots        how often each cell was fired at
+#   hits         how often a shot there hit (HIT / SUNK / ALL_SUNK)
+#   hit_rate     hits / shots, NaN for cells never fired at
+#   first_shot   how often each cell was the opening shot of a game
+#   placements   (cells,) how often our ships covered each cell
+#
+#   python3 analytics.py out_dir grid_size file.bsr [file.bsr ...]   # heatmaps.npz + one PNG per map
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from replay import ReplayReader, GAME_START, PLACE, RESULT
+
+GRID_SIZE = 5
+PNG_CELL = 32  # pixels per cell in the PNGs
+
+class Heatmaps:
+    def __init__(self, grid_size=GRID_SIZE):
+        self.grid_size = grid_size
+        cells = grid_size * grid_size
+        self.games = 0
+        self.shots = np.zeros((2, cells), dtype=np.int64)
+        self.hits = np.zeros((2, cells), dtype=np.int64)
+        self.first_shot = np.zeros((2, cells), dtype=np.int64)
+        self.placements = np.zeros(cells, dtype=np.int64)
+
+    def add(self, records):
+        """Fold a replay record array into the heatmaps. Games on other grid
+        sizes, and records before the first GAME_START, are skipped."""
+        n, cells = self.grid_size, self.grid_size * self.grid_size
+        kind = records["kind"]
+        starts = np.flatnonzero(kind == GAME_START)
+        if not len(starts): return
+        game = np.cumsum(kind == GAME_START) - 1
+        keep = (game >= 0) & (records["x"][starts][np.maximum(game, 0)] == n)
+        self.games += int((records["x"][starts] == n).sum())
+        x = records["x"].astype(np.int64)
+        y = records["y"].astype(np.int64)
+        cell = y * n + x
+        side = records["value"].astype(np.int64)
+
+        shot = first_of(keep & (kind == RESULT), (game * 2 + side) * cells + cell)
+        key = side[shot] * cells + cell[shot]
+        self.shots += np.bincount(key, minlength=2 * cells).reshape(2, cells)
+        hit = records["extra"][shot] > 0
+        self.hits += np.bincount(key[hit], minlength=2 * cells).reshape(2, cells)
+
+        # records are in game order, so the first occurrence of each (game, side) is its opening shot
+        _, first = np.unique(game[shot] * 2 + side[shot], return_index=True)
+        self.first_shot += np.bincount(key[first], minlength=2 * cells).reshape(2, cells)
+
+        place = first_of(keep & (kind == PLACE),
+                         ((game * cells + cell) * 256 + side) * 2 + records["extra"])
+        length = side[place]  # PLACE keeps the ship length in value
+        if len(length):
+            step = np.where(records["extra"][place] == 0, 1, n)
+            k = np.arange(length.max())
+            covered = cell[place][:, None] + k[None, :] * step[:, None]
+            self.placements += np.bincount(covered[k[None, :] < length[:, None]], minlength=cells)
+
+    def add_file(self, path):
+        reader = ReplayReader(path)
+        records = reader.array()
+        self.add(records)
+        del records  # the array borrows the mmap, which can't close under it
+        reader.close()
+
+    @property
+    def hit_rate(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.shots > 0, self.hits / self.shots, np.nan)
+
+    def maps(self):
+        """name -> (grid_size, grid_size) array for every heatmap"""
+        shape = (self.grid_size, self.grid_size)
+        out = {"placements": self.placements.reshape(shape)}
+        for name, data in (("shots", self.shots), ("hits", self.hits),
+                           ("hit_rate", self.hit_rate), ("first_shot", self.first_shot)):
+            out[f"{name}_ours"] = data[0].reshape(shape)
+            out[f"{name}_theirs"] = data[1].reshape(shape)
+        return out
+
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        maps = self.maps()
+        np.savez(os.path.join(out_dir, "heatmaps.npz"), games=self.games, **maps)
+        for name, data in maps.items():
+            save_png(data, os.path.join(out_dir, name + ".png"))
+
+def first_of(mask, key):
+    """Indices where mask is set, keeping only the first record of each key"""
+    picked = np.flatnonzero(mask)
+    _, first = np.unique(key[picked], return_index=True)
+    return np.sort(picked[first])
+
+def save_png(data, path, cell=PNG_CELL):
+    """Write a 2-D array as a blue (low) to red (high) PNG. NaN cells are grey."""
+    import pygame  # only needed for the PNGs; works without a display
+    finite = np.isfinite(data)
+    lo = data[finite].min() if finite.any() else 0
+    hi = data[finite].max() if finite.any() else 0
+    t = np.where(finite, (data - lo) / (hi - lo) if hi > lo else 0.0, 0.0)
+    rgb = np.stack([t * 255, np.zeros_like(t) + 40, (1 - t) * 255], axis=-1)
+    rgb[~finite] = 128
+    rgb = np.repeat(np.repeat(rgb, cell, axis=0), cell, axis=1).astype(np.uint8)
+    pygame.image.save(pygame.surfarray.make_surface(rgb.transpose(1, 0, 2)), path)
+
+if __name__ == "__main__":
+    out_dir = sys.argv[1]
+    grid = int(sys.argv[2])
+    heatmaps = Heatmaps(grid)
+    start = time.perf_counter()
+    for path in sys.argv[3:]:
+        heatmaps.add_file(path)
+    elapsed = time.perf_counter() - start
+    heatmaps.save(out_dir)
+    print(f"{heatmaps.games} games from {len(sys.argv) - 3} logs in {elapsed:.2f}s")
+    first = heatmaps.first_shot[0]
+    if first.any():
+        best = int(first.argmax())
+        print(f"favourite opening shot {(best % grid, best // grid)} ({first[best] / first.sum():.1%} of games)")
@@ -0,0 +1,103 @@
+# batch_sim.py
+# Vectorized simulator: N boards live in NumPy arrays and every step fires one
+# shot into every unfinished game at once, scoring it with the same
+# MISS / HIT / SUNK / ALL_SUNK rules as receiving_state.
+#
+#   python3 batch_sim.py [games] [grid_size] [fleet, e.g. 3,2]
+
+import sys
+import time
+
+import numpy as np
+
+from sampler import get_sampler
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+MISS, HIT, SUNK, ALL_SUNK = 0, 1, 2, 3
+RESULT_NAMES = ["MISS", "HIT", "SUNK", "ALL_SUNK"]
+
+def random_layouts(n, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, rng=None):
+    """(n, cells) int8 array of ship ids (fleet order), -1 for water. Layouts
+    come from sampler.py: uniform over every legal fleet placement, except on
+    boards too big for its exact prefix table."""
+    return get_sampler(grid_size, fleet).sample_ship_ids(n, rng)
+
+class BatchSim:
+    def __init__(self, n, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, rng=None, ship_id=None):
+        self.rng = rng or np.random.default_rng()
+        self.n = n
+        self.grid_size = grid_size
+        self.cells = grid_size * grid_size
+        self.fleet = list(fleet)
+        self.ship_id = random_layouts(n, grid_size, fleet, self.rng) if ship_id is None else ship_id
+        self.fleet_mask = self.ship_id >= 0
+        self.shots = np.zeros((n, self.cells), dtype=bool)
+        self.hp = np.tile(np.array(self.fleet, dtype=np.int16), (n, 1))
+        self.remaining = np.full(n, sum(self.fleet), dtype=np.int16)
+        self.turns = np.zeros(n, dtype=np.int32)
+        self.finish_turn = np.full(n, -1, dtype=np.int32)
+        self.done = np.zeros(n, dtype=bool)
+
+    def step(self, targets):
+        """Fire targets[i] into game i. Returns an int8 result per game, -1 for
+        games that were already finished."""
+        results = np.full(self.n, -1, dtype=np.int8)
+        live = np.flatnonzero(~self.done)
+        cell = targets[live]
+        repeat = self.shots[live, cell]
+        self.shots[live, cell] = True
+        self.turns[live] += 1
+
+        ship = self.ship_id[live, cell].astype(np.intp)
+        hit = (ship >= 0) & ~repeat
+        res = np.zeros(len(live), dtype=np.int8)
+        hg, hs = live[hit], ship[hit]
+        self.hp[hg, hs] -= 1
+        self.remaining[hg] -= 1
+        res[hit] = np.where(self.hp[hg, hs] == 0, SUNK, HIT)
+        res[hit & (self.remaining[live] == 0)] = ALL_SUNK
+
+        results[live] = res
+        won = live[res == ALL_SUNK]
+        self.done[won] = True
+        self.finish_turn[won] = self.turns[won]
+        return results
+
+    def run_random(self):
+        """Every game shoots the board in its own random order until ALL_SUNK"""
+        order = self.rng.permuted(np.tile(np.arange(self.cells, dtype=np.int16), (self.n, 1)), axis=1)
+        for t in range(self.cells):
+            if self.done.all(): break
+            self.step(order[:, t])
+        return self.finish_turn
+
+def play_matches(n, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, rng=None):
+    """n random-vs-random matches. The first player (master) wins ties because
+    it shoots first. Returns (first_player_won, winner_turns)."""
+    rng = rng or np.random.default_rng()
+    a = BatchSim(n, grid_size, fleet, rng).run_random()
+    b = BatchSim(n, grid_size, fleet, rng).run_random()
+    first_won = a <= b
+    return first_won, np.where(first_won, a, b)
+
+def turn_distribution(turns, cells):
+    """Fraction of games won on each turn, indexed by turn number"""
+    return np.bincount(turns, minlength=cells + 1) / len(turns)
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    grid = int(sys.argv[2]) if len(sys.argv) > 2 else GRID_SIZE
+    fleet = [int(v) for v in sys.argv[3].split(",")] if len(sys.argv) > 3 else SHIPS_TO_PLACE
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    first_won, turns = play_matches(games, grid, fleet, rng)
+    elapsed = time.perf_counter() - start
+
+    print(f"{games} matches on {grid}x{grid} {fleet} in {elapsed:.2f}s, first player won {first_won.mean():.1%}")
+    print(f"win turn: mean {turns.mean():.2f}, min {turns.min()}, max {turns.max()}")
+    dist = turn_distribution(turns, grid * grid)
+    for t in np.flatnonzero(dist):
+        print(f"  {t:4d} {dist[t]:6.2%} {'#' * int(dist[t] * 200)}")
@@ -5,12 +5,18 @@ import json
 import time
 import platform
 
+from board import Board
+from sampler import get_sampler
+
 # --- Global Constants & Variables ---
 PIPE_OUT = "" 
 PIPE_IN = ""  
 IS_MASTER_PI = False 
 
+# Large-board mode: GRID_SIZE can go up to 1000 (with a fleet to match).
+# Only a VIEW_CELLS window around the cursor is ever drawn.
 GRID_SIZE = 5
+VIEW_CELLS = min(GRID_SIZE, 5)
 SCREEN_WIDTH = 240
 SCREEN_HEIGHT = 320
 GRID_OFFSET_X = 10
@@ -41,19 +47,18 @@ DISPLAY_MESSAGE = ""
 MESSAGE_DISPLAY_TIME = 0 
 result_display_time = 0 
 
-ship_positions = {}
-shots_fired = {}
+my_board = Board(GRID_SIZE)
+enemy_board = Board(GRID_SIZE)
 shooting_cursor_pos = (0, 0) 
-my_board_shots = {}
+view_origin = (0, 0)  # top-left cell of the drawn window
 
 SHIPS_TO_PLACE = [3, 2] 
+FLEET_SAMPLER = get_sampler(GRID_SIZE, SHIPS_TO_PLACE)
 ship_placement_index = 0
 current_ship_length = SHIPS_TO_PLACE[0]
 current_ship_orientation = "horizontal"
-occupied_placement = set()
 
 # Message tracking to prevent duplicates
-processed_shot_coords = set()
 last_sent_shot = None
 message_sequence = 0
 
@@ -143,64 +148,61 @@ def get_ship_positions(start, length, orientation):
     if orientation == "horizontal": return [(x + i, y) for i in range(length)]
     else: return [(x, y + i) for i in range(length)]
 
-def in_bounds(positions, grid_width, grid_height):
-    return all(0 <= x < grid_width and 0 <= y < grid_height for x, y in positions)
-
-def ship_overlaps(positions, occupied):
-    return any(pos in occupied for pos in positions)
-
-def check_if_sunk(ship_parts):
-    return all(part["hit"] for part in ship_parts)
-
 def check_for_game_over():
-    return all(ship["sunk"] for ship in ship_positions.values())
-
-def get_ship_part_at(coord):
-    for ship in ship_positions.values():
-        for part in ship['parts']:
-            if part['pos'] == coord: return part
-    return None
+    return my_board.all_sunk()
 
 # --- Drawing Functions ---
 
 def draw_grid(is_shooting_board, cursor_pos=None, temp_ship_positions=None):
-    global ship_positions
     screen.fill(WATER_COLOR)
-    for x in range(GRID_SIZE):
-        for y in range(GRID_SIZE):
-            rect = pygame.Rect(GRID_OFFSET_X + x * CELL_SIZE, GRID_OFFSET_Y + y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+    preview_valid = temp_ship_positions is not None and my_board.can_place(shooting_cursor_pos, current_ship_length, current_ship_orientation)
+    if cursor_pos: follow(cursor_pos)
+    vx, vy = view_origin
+    for x in range(vx, vx + VIEW_CELLS):
+        for y in range(vy, vy + VIEW_CELLS):
+            rect = pygame.Rect(*cell_xy((x, y)), CELL_SIZE, CELL_SIZE)
             pygame.draw.rect(screen, LINE_COLOR, rect, 1) 
             coord = (x, y)
             
             if not is_shooting_board:
-                ship_part = get_ship_part_at(coord)
-                if ship_part:
+                if my_board.has_ship(coord):
+                    is_hit = my_board.is_hit(coord)
                     color = SHIP_COLOR
-                    if ship_part['hit']: color = (100, 0, 0) 
+                    if is_hit: color = (100, 0, 0) 
                     pygame.draw.rect(screen, color, rect, 0) 
                     pygame.draw.rect(screen, LINE_COLOR, rect, 1) 
-                    if ship_part['hit']: draw_marker(coord, HIT_COLOR)
+                    if is_hit: draw_marker(coord, HIT_COLOR)
                 elif temp_ship_positions and coord in temp_ship_positions:
-                    ship_coords = get_ship_positions(shooting_cursor_pos, current_ship_length, current_ship_orientation)
-                    is_valid = in_bounds(ship_coords, GRID_SIZE, GRID_SIZE) and not ship_overlaps(ship_coords, occupied_placement)
-                    fill_color = SHIP_COLOR if is_valid else INVALID_COLOR
+                    fill_color = SHIP_COLOR if preview_valid else INVALID_COLOR
                     pygame.draw.rect(screen, fill_color, rect, 0)
                     pygame.draw.rect(screen, LINE_COLOR, rect, 1)
             
-            if is_shooting_board and coord in shots_fired:
-                result = shots_fired[coord]
-                if result == "MISS": draw_marker(coord, MISS_COLOR)
-                elif result in ["HIT", "SUNK", "ALL_SUNK"]: draw_marker(coord, HIT_COLOR)
-            elif not is_shooting_board and coord in my_board_shots and my_board_shots[coord] == "MISS":
+            if is_shooting_board:
+                if enemy_board.is_miss(coord): draw_marker(coord, MISS_COLOR)
+                elif enemy_board.is_hit(coord): draw_marker(coord, HIT_COLOR)
+            elif my_board.is_miss(coord):
                 draw_marker(coord, MISS_COLOR)
     
     if cursor_pos:
-        rect = pygame.Rect(GRID_OFFSET_X + cursor_pos[0] * CELL_SIZE, GRID_OFFSET_Y + cursor_pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+        rect = pygame.Rect(*cell_xy(cursor_pos), CELL_SIZE, CELL_SIZE)
         pygame.draw.rect(screen, CURSOR_COLOR, rect, 3)
 
+def follow(coord):
+    """Scroll the view just far enough to keep coord on screen"""
+    global view_origin
+    vx = min(max(view_origin[0], coord[0] - VIEW_CELLS + 1), coord[0])
+    vy = min(max(view_origin[1], coord[1] - VIEW_CELLS + 1), coord[1])
+    view_origin = (vx, vy)
+
+def cell_xy(coord):
+    """Screen position of a cell's top-left corner under the current view"""
+    return (GRID_OFFSET_X + (coord[0] - view_origin[0]) * CELL_SIZE,
+            GRID_OFFSET_Y + (coord[1] - view_origin[1]) * CELL_SIZE)
+
 def draw_marker(coord, color):
-    center_x = GRID_OFFSET_X + coord[0] * CELL_SIZE + CELL_SIZE // 2
-    center_y = GRID_OFFSET_Y + coord[1] * CELL_SIZE + CELL_SIZE // 2
+    x, y = cell_xy(coord)
+    center_x = x + CELL_SIZE // 2
+    center_y = y + CELL_SIZE // 2
     radius = CELL_SIZE // 4
     pygame.draw.circle(screen, color, (center_x, center_y), radius)
 
@@ -289,9 +291,9 @@ def waiting_state():
         pygame.quit(); sys.exit()
 
 def placing_ships_state():
-    global done_placing_ships, shooting_cursor_pos, ship_positions, opponent_ready
+    global done_placing_ships, shooting_cursor_pos, opponent_ready
     global current_ship_length, current_ship_orientation, ship_placement_index
-    global occupied_placement, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
+    global DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
     grid_w, grid_h = GRID_SIZE, GRID_SIZE
     
     if not done_placing_ships:
@@ -304,12 +306,24 @@ def placing_ships_state():
                 elif event.key == pygame.K_LEFT: x = (x - 1 + grid_w) % grid_w 
                 elif event.key == pygame.K_UP: y = (y - 1 + grid_h) % grid_h 
                 elif event.key == pygame.K_r: current_ship_orientation = "vertical" if current_ship_orientation == "horizontal" else "horizontal"
+                elif event.key == pygame.K_a:
+                    # Auto-place whatever is left of the fleet, uniformly over the layouts that complete it
+                    picks = FLEET_SAMPLER.complete(my_board.fleet, SHIPS_TO_PLACE[ship_placement_index:])
+                    if picks is None:
+                        DISPLAY_MESSAGE = "Remaining ships don't fit."
+                        MESSAGE_DISPLAY_TIME = time.time() + 1.5
+                    else:
+                        for start, length, orientation in picks:
+                            my_board.place_ship(start, length, orientation)
+                        ship_placement_index = len(SHIPS_TO_PLACE)
+                        done_placing_ships = True
+                        DISPLAY_MESSAGE = "All ships placed. Waiting for opponent."
+                        MESSAGE_DISPLAY_TIME = time.time() + 2.0
+                        send_data({"type": "SHIPS_PLACED"})
+                        break
                 elif event.key == pygame.K_SPACE: 
-                    ship_coords = get_ship_positions(shooting_cursor_pos, current_ship_length, current_ship_orientation)
-                    if in_bounds(ship_coords, grid_w, grid_h) and not ship_overlaps(ship_coords, occupied_placement):
-                        new_ship_name = f"ship_{ship_placement_index}"
-                        ship_positions[new_ship_name] = {"parts": [{"pos": pos, "hit": False} for pos in ship_coords], "sunk": False}
-                        occupied_placement.update(ship_coords)
+                    if my_board.can_place(shooting_cursor_pos, current_ship_length, current_ship_orientation):
+                        my_board.place_ship(shooting_cursor_pos, current_ship_length, current_ship_orientation)
                         ship_placement_index += 1
                         if ship_placement_index < len(SHIPS_TO_PLACE):
                             current_ship_length = SHIPS_TO_PLACE[ship_placement_index]
@@ -365,7 +379,7 @@ def deciding_first_turn_state():
             first_turn_decided = True
 
 def shooting_state():
-    global shot_fired, shooting_result_received, shooting_cursor_pos, shots_fired
+    global shot_fired, shooting_result_received, shooting_cursor_pos
     global DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME, game_over, last_sent_shot, result_display_time
     
     if not shot_fired:
@@ -379,13 +393,13 @@ def shooting_state():
                 elif event.key == pygame.K_UP: y = (y - 1 + GRID_SIZE) % GRID_SIZE 
                 elif event.key == pygame.K_SPACE: 
                     target_pos = (x, y)
-                    if target_pos in shots_fired:
+                    if enemy_board.is_shot(target_pos):
                         DISPLAY_MESSAGE = "Already shot here!"
                         MESSAGE_DISPLAY_TIME = time.time() + 1.5
                         continue
                     shot_data = {"type": "SHOT", "coord": target_pos}
                     if send_data(shot_data):
-                        shots_fired[target_pos] = None 
+                        enemy_board.mark_pending(target_pos)
                         last_sent_shot = target_pos
                         shot_fired = True
                         DISPLAY_MESSAGE = f"Firing shot at {target_pos}..."
@@ -400,7 +414,7 @@ def shooting_state():
             shooting_result = data.get("result")
             coord = tuple(data.get("coord"))
             if coord == last_sent_shot:
-                shots_fired[coord] = shooting_result 
+                enemy_board.record_result(coord, shooting_result)
                 DISPLAY_MESSAGE = f"Result: {shooting_result} at {coord}"
                 MESSAGE_DISPLAY_TIME = time.time() + 3.0 
                 result_display_time = time.time() + 3.0 
@@ -408,7 +422,7 @@ def shooting_state():
                 shooting_result_received = True
 
 def receiving_state():
-    global shooting_result_sent, game_over, my_board_shots, processed_shot_coords
+    global shooting_result_sent, game_over
     global DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME, result_display_time
     
     for event in pygame.event.get():
@@ -418,25 +432,11 @@ def receiving_state():
     enemy_shot_data = receive_data()
     if enemy_shot_data and enemy_shot_data.get("type") == "SHOT":
         enemy_shot_coord = tuple(enemy_shot_data.get("coord"))
-        if enemy_shot_coord in processed_shot_coords: return 
-        processed_shot_coords.add(enemy_shot_coord)
-        
-        result = "MISS"
-        is_hit = False
-        for ship_name, ship_data in ship_positions.items():
-            if ship_data["sunk"]: continue
-            for part in ship_data["parts"]:
-                if part["pos"] == enemy_shot_coord and not part["hit"]:
-                    part["hit"] = True; is_hit = True
-                    if check_if_sunk(ship_data["parts"]):
-                        ship_data["sunk"] = True; result = "SUNK"
-                        if check_for_game_over(): game_over = True; result = "ALL_SUNK"
-                        break
-                    else: result = "HIT"
-                    break
-            if is_hit: break
+        if my_board.is_shot(enemy_shot_coord): return 
         
-        my_board_shots[enemy_shot_coord] = result 
+        result = my_board.receive_shot(enemy_shot_coord)
+        follow(enemy_shot_coord)
+        if result == "ALL_SUNK": game_over = True
         DISPLAY_MESSAGE = f"Enemy shot at {enemy_shot_coord}. Result: {result}."
         MESSAGE_DISPLAY_TIME = time.time() + 3.0 
         
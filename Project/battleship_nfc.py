@@ -18,8 +18,21 @@ import RPi.GPIO as GPIO
 from enum import Enum
 import random
 import math
-
-os.environ["SDL_VIDEODRIVER"] = "fbcon"
+import itertools
+from collections import OrderedDict
+
+from board import Board, encode_results, decode_results, HIT_RESULTS
+from sampler import get_sampler, SPARSE_MIN_CELLS
+from advisor import ShotAdvisor, AdviceJob
+from peer import AIPeer
+from preview import PlacementPreview
+from replay import ReplayWriter, OURS, THEIRS
+from opening_book import get_book
+from presets import PRESETS
+from history import GameHistory
+from snapshot import GameSnapshot, SnapshotWriter
+
+os.environ["SDL_VIDEODRIVER"] = os.environ.get("BATTLESHIP_VIDEODRIVER", "fbcon")  # replay_bench.py uses "dummy"
 os.environ["SDL_FBDEV"] = "/dev/fb0"
 os.environ["SDL_MOUSEDRV"] = "dummy"
 os.environ["SDL_MOUSEDEV"] = "/dev/null"
@@ -61,6 +74,7 @@ status = Status.DISCONNECTED
 client_sem = threading.Semaphore(0)
 my_addr = bluetooth.read_local_bdaddr()[0]
 target_addr = None
+peer_addr = None  # address of whoever we're playing, for the game history
 IS_MASTER_PI = False
 reset_needed = False
 running = True
@@ -135,7 +149,7 @@ def nfc_pipe_watcher():
         print(f"NFC Pipe Error: {e}")
 
 def rfcomm_server():
-    global mode, status, server_sock, rfcomm_sock, IS_MASTER_PI, reset_needed
+    global mode, status, server_sock, rfcomm_sock, IS_MASTER_PI, reset_needed, peer_addr
     print("NET: Server thread started (Initializing Socket...)")
     
     try:
@@ -165,6 +179,7 @@ def rfcomm_server():
 
             print(f"NET: Accepted connection from {addr}. I am SERVER.")
             rfcomm_sock = new_client 
+            peer_addr = addr[0]
             mode = Mode.SERVER
             status = Status.CONNECTED
             IS_MASTER_PI = True 
@@ -197,7 +212,7 @@ def rfcomm_server():
             time.sleep(0.1)
 
 def rfcomm_client():
-    global mode, status, client_sock, target_addr, client_sem, IS_MASTER_PI, reset_needed
+    global mode, status, client_sock, target_addr, client_sem, IS_MASTER_PI, reset_needed, peer_addr
     
     print("NET: Client thread started (Waiting for NFC...)")
     
@@ -225,6 +240,7 @@ def rfcomm_client():
             client_sock.connect((target_addr, 1))
             
             print(f"NET: Connected to {target_addr}. I am CLIENT.")
+            peer_addr = target_addr
             status = Status.CONNECTED
             IS_MASTER_PI = False
             
@@ -276,13 +292,12 @@ def reset_game_state():
     global game_state, is_connected, done_placing_ships, opponent_ready
     global first_turn_started, first_turn_decided, has_first_turn
     global shooting_result_received, shooting_result_sent, game_over, shot_fired
-    global ship_positions, shots_fired, my_board_shots, occupied_placement
-    global processed_shot_coords, ship_placement_index, current_ship_length
+    global my_board, enemy_board, ship_placement_index, current_ship_length
     global mode, status, server_sock, rfcomm_sock, client_sock, reset_needed
     global DISPLAY_MESSAGE, target_addr
     global handshake_sent, handshake_complete
-    global shooting_cursor_pos, current_ship_orientation
-    global particles, shake_end_time, flash_alpha, floating_texts
+    global shooting_cursor_pos, view_origin, current_ship_orientation
+    global particles, shake_end_time, flash_alpha, floating_texts, shot_advice, salvo_targets, book_node
 
     print("GAME: Performing Soft Reset to START SCREEN...")
     
@@ -309,14 +324,14 @@ def reset_game_state():
     shooting_result_sent = False
     game_over = False
     shot_fired = False
+    salvo_targets = []
     
-    ship_positions = {}
-    shots_fired = {}
-    my_board_shots = {}
-    occupied_placement = set()
-    processed_shot_coords = set()
+    select_preset(preset_index)  # back to our own pick if the last opponent's was adopted
+    my_board = Board(GRID_SIZE)
+    enemy_board = Board(GRID_SIZE)
     
     shooting_cursor_pos = (0, 0)
+    view_origin = (0, 0)
     current_ship_orientation = "horizontal"
     
     ship_placement_index = 0
@@ -331,12 +346,22 @@ def reset_game_state():
     floating_texts = []
     shake_end_time = 0
     flash_alpha = 0
+    shot_advice = None
+    book_node = 0
     
     with tx_queue.mutex: tx_queue.queue.clear()
     with rx_queue.mutex: rx_queue.queue.clear()
     
     DISPLAY_MESSAGE = ""
 
+def connect_ai_peer():
+    """VS_COMPUTER: 'connect' to the in-process peer, with a coin toss for who shoots first"""
+    global status, IS_MASTER_PI
+    IS_MASTER_PI = random.random() < 0.5
+    ai_peer.first = not IS_MASTER_PI
+    status = Status.CONNECTED
+    print(f"GAME: Playing the computer. {'You go' if IS_MASTER_PI else 'Computer goes'} first.")
+
 def check_quit_button():
     global quit_press_start, running
     if not GPIO.input(BUTTON_SELECT):
@@ -350,16 +375,23 @@ def check_quit_button():
                 else:
                     print("USER: Resetting to Start Screen...")
                     send_data({"type": "DISCONNECT"})
+                    if snapshots: snapshots.discard()
                     time.sleep(0.5) 
                     reset_game_state()
                     quit_press_start = None 
     else:
         quit_press_start = None
 
-GRID_SIZE = 5
-CELL_SIZE = 40 
-GRID_OFFSET_X = 20 
-GRID_OFFSET_Y = 60 
+# Board / fleet presets (presets.py), cycled with RIGHT on the start screen.
+# The master's preset wins at the HELLO handshake. In large-board mode only a
+# VIEW_CELLS window around the cursor is drawn.
+preset_index = 0
+GRID_SIZE = PRESETS[0][1]
+MAX_VIEW_CELLS = 10
+MAX_CELL_SIZE = 40
+GRID_AREA = (220, 215)  # canvas room for the drawn window, between the title line and the icons
+GRID_OFFSET_Y = 60
+# VIEW_CELLS, CELL_SIZE, GRID_OFFSET_X and the sprites are set per preset by apply_preset()
 
 LINE_COLOR = (0, 0, 0)
 WATER_COLOR = (240, 240, 240)
@@ -368,6 +400,10 @@ RETICLE_COLOR = (255, 0, 0)
 MISS_COLOR = (255, 0, 0)
 HIT_COLOR = (200, 0, 0)
 INVALID_COLOR = (255, 100, 0)  
+PREVIEW_VALID_TINT = (255, 255, 255, 150)  # multiplied into ship sprites
+PREVIEW_INVALID_TINT = (255, 0, 0, 100)
+SUNK_TINT = (90, 90, 90, 255)
+ADVICE_COLOR = (0, 150, 255)
 TEXT_COLOR = (0, 0, 0)            
 ICON_COLOR = (0, 0, 0)
 
@@ -377,6 +413,13 @@ SHAKE_DURATION = 0.25
 SHAKE_INTENSITY = 3
 FLASH_INTENSITY = 180
 
+SALVO_SIZE = 1  # shots per turn (the master's wins at HELLO); above 1 they go out together as one SHOT_BATCH
+SHOW_SHOT_ADVICE = False  # Monte Carlo hint on the attack board, worked out during RECEIVING
+VS_COMPUTER = False  # single-device mode: an in-process AIPeer replaces the RFCOMM link
+REPLAY_PATH = "replays.bsr"  # every match is appended here (see replay.py); None to turn off
+HISTORY_DB = "history.db"  # finished games for win-rate / streak queries (see history.py); None to turn off
+SNAPSHOT_PATH = "game.snap"  # written every turn so a crashed match can resume (see snapshot.py); None to turn off
+
 game_state = "START_SCREEN"
 connection_enabled.clear()
 
@@ -400,17 +443,17 @@ DISPLAY_MESSAGE = ""
 MESSAGE_DISPLAY_TIME = 0 
 result_display_time = 0 
 
-ship_positions = {}
-shots_fired = {}
+my_board = Board(GRID_SIZE)
+enemy_board = Board(GRID_SIZE)
 shooting_cursor_pos = (0, 0) 
-my_board_shots = {}
-SHIPS_TO_PLACE = [3, 2] 
+view_origin = (0, 0)  # top-left cell of the drawn window
+SHIPS_TO_PLACE = list(PRESETS[0][2])
+FLEET_SAMPLER = get_sampler(GRID_SIZE, SHIPS_TO_PLACE)
 ship_placement_index = 0
 current_ship_length = SHIPS_TO_PLACE[0]
 current_ship_orientation = "horizontal"
-occupied_placement = set()
-processed_shot_coords = set()
 last_sent_shot = None
+salvo_targets = []  # SALVO_SIZE > 1: aimed this turn, or sent and awaiting SALVO_RESULT
 message_sequence = 0
 waiting_for_opponent_ready = False
 
@@ -419,6 +462,22 @@ floating_texts = []
 shake_end_time = 0
 flash_alpha = 0
 
+shot_advisor = None
+shot_advice = None
+opening_book = None
+book_node = 0  # opening-book position of our shots so far, None once out of book
+ai_peer = None
+replay_log = None
+game_history = None
+game_started_at = 0
+snapshots = None  # SnapshotWriter for SNAPSHOT_PATH once main() is running
+saved_game = None  # snapshot offered in our HELLO, until the handshake settles resume or not
+hello_nonce = 0    # random number sent in our HELLO; XORed with the peer's it makes the match id
+match_id = 0       # identifies this match in both sides' snapshots
+placement_preview = PlacementPreview()
+preset_layouts = {}  # (grid size, ship lengths) -> (view cells, cell size, x offset, ship atlas, marker sprites)
+layers = {}  # name -> (key, ..., surface) for the cached grid, ships and marks layers
+
 pygame.init()
 pitft = pigame.PiTft() 
 screen = pygame.display.set_mode((320, 240))
@@ -431,29 +490,241 @@ BIG_FONT = pygame.font.Font(None, 40)
 HUGE_FONT = pygame.font.Font(None, 60)
 CLOCK = pygame.time.Clock()
 
+class Portrait:
+    """Draws the game's 240x320 portrait layout straight onto a surface stored
+    in the screen's landscape orientation. Portrait (x, y) is landscape
+    (y, width - 1 - x), i.e. the portrait frame turned 90 degrees anticlockwise.
+    Sprites blitted through it must already be turned the same way (see
+    upright()), so nothing is rotated per frame."""
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.width = surface.get_height()  # portrait width
+
+    def rect(self, rect):
+        """Landscape rect covering a portrait rect"""
+        x, y, w, h = rect
+        return pygame.Rect(y, self.width - x - w, h, w)
+
+    def point(self, pos):
+        return (pos[1], self.width - 1 - pos[0])
+
+    def fill(self, color, rect=None):
+        self.surface.fill(color, None if rect is None else self.rect(rect))
+
+    def blit(self, sprite, pos):
+        x, y = pos
+        self.surface.blit(sprite, (y, self.width - x - sprite.get_height()))
+
+    def polygon(self, color, points):
+        pygame.draw.polygon(self.surface, color, [self.point(p) for p in points])
+
+    def set_clip(self, rect):
+        self.surface.set_clip(None if rect is None else self.rect(rect))
+
+def upright(sprite):
+    """A portrait-drawn sprite turned to the screen's orientation, once, when
+    it is built"""
+    return pygame.transform.rotate(sprite, 90)
+
+def portrait_size(sprite):
+    """(width, height) of an upright() sprite as it appears in the portrait layout"""
+    return sprite.get_height(), sprite.get_width()
+
+def centered(sprite, center):
+    """Portrait position that centres an upright() sprite on center"""
+    w, h = portrait_size(sprite)
+    return center[0] - w // 2, center[1] - h // 2
+
+# Retained frame: update_screen() redraws and pushes only what changed in it.
+# It is laid out in portrait but stored, like the screen, in landscape.
+frame_surface = pygame.Surface(screen.get_size())
+frame_canvas = Portrait(frame_surface)
+CANVAS_RECT = pygame.Rect(0, 0, 240, 320)  # in portrait
+HEADER_RECT = pygame.Rect(0, 0, 240, 45)  # message line and title
+flash_surf = pygame.Surface(screen.get_size())
+flash_surf.fill((255, 255, 255))
+wave_offset = 0  # background bob this frame, in pixels
+pulse_scale = 1.0  # WAITING / END text pulse this frame
+
+# Looping animations are sampled from precomputed curves, CURVE_STEPS points
+# a cycle and whole pixels where they move things, so every frame they can
+# produce is one of a small set and can be pre-rendered and cached
+CURVE_STEPS = 64
+BACKDROP_CACHE_BYTES = 4 * 1024 * 1024  # water + background + grid frames
+TEXT_CACHE_BYTES = 1024 * 1024  # rendered and pulse-scaled text
+
+def sine_curve(base, amplitude):
+    return [base + amplitude * math.sin(2 * math.pi * i / CURVE_STEPS) for i in range(CURVE_STEPS)]
+
+WAVE_CURVE = [int(v) for v in sine_curve(-20, 4)]  # background bob, 1.5 rad/s
+LOGO_CURVE = [int(v) for v in sine_curve(logo_base_y, 5)]  # start screen logo, 5 rad/s
+WAITING_PULSE = sine_curve(1.0, 0.05)  # 5 rad/s
+END_PULSE = sine_curve(1.0, 0.1)  # 8 rad/s
+
+def curve_at(curve, speed, now):
+    """Sample of a curve looping at speed radians per second"""
+    return curve[int(now * speed * CURVE_STEPS / (2 * math.pi)) % CURVE_STEPS]
+
+class SurfaceCache:
+    """Surfaces by key, dropping the least recently used past a byte budget"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.surfaces = OrderedDict()
+
+    def get(self, key, build):
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        surf = self.surfaces[key] = build()
+        self.used += surface_bytes(surf)
+        while self.used > self.budget and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.used -= surface_bytes(old)
+        return surf
+
+def surface_bytes(surf):
+    return surf.get_pitch() * surf.get_height()
+
+backdrop_cache = SurfaceCache(BACKDROP_CACHE_BYTES)
+text_cache = SurfaceCache(TEXT_CACHE_BYTES)
+last_scene = None  # anything that forces a full frame when it changes
+last_regions = {}  # frame_regions() as of the last frame
+last_counts = (0, 0, 0)  # our ships, our board's shots, enemy board's shots, as of the last frame
+
 background_img = None 
 
 try:
-    ship_img_2 = pygame.image.load("ShipDestroyerHull.png").convert_alpha()
-    ship_img_3 = pygame.image.load("ShipCruiserHull.png").convert_alpha()
-    ship_assets = {
-        2: pygame.transform.scale(ship_img_2, (CELL_SIZE, CELL_SIZE * 2)),
-        3: pygame.transform.scale(ship_img_3, (CELL_SIZE, CELL_SIZE * 3))
+    ship_raw = {
+        2: pygame.image.load("ShipDestroyerHull.png").convert_alpha(),
+        3: pygame.image.load("ShipCruiserHull.png").convert_alpha()
     }
-    
+
     hit_raw = pygame.image.load("hit.png").convert_alpha()
-    marker_assets = {
-        "HIT": pygame.transform.scale(hit_raw, (CELL_SIZE, CELL_SIZE))
-    }
-    
+
     bg_raw = pygame.image.load("background.png").convert()
-    background_img = pygame.transform.scale(bg_raw, (240, 360))
-    
+    background_img = upright(pygame.transform.scale(bg_raw, (240, 360)))
+
 except Exception as e:
     print(f"ERROR LOADING IMAGES: {e}")
-    ship_assets = {}
-    marker_assets = {} 
-    background_img = None 
+    ship_raw = {}
+    hit_raw = None
+    background_img = None
+
+def ship_sprite(length, cell):
+    """Vertical hull sprite, bow at the top, upright(). Only 2 and 3 have
+    artwork; other lengths keep the cruiser's bow and stern and repeat its
+    midsection."""
+    if length in ship_raw:
+        return upright(pygame.transform.scale(ship_raw[length], (cell, cell * length)))
+    hull = pygame.transform.scale(ship_raw[3], (cell, cell * 3))
+    img = pygame.Surface((cell, cell * length), pygame.SRCALPHA)
+    img.blit(hull, (0, 0), (0, 0, cell, cell))
+    for i in range(1, length - 1):
+        img.blit(hull, (0, i * cell), (0, cell, cell, cell))
+    img.blit(hull, (0, (length - 1) * cell), (0, 2 * cell, cell, cell))
+    return upright(img)
+
+SHIP_TINTS = {"normal": None, "preview-valid": PREVIEW_VALID_TINT,
+              "preview-invalid": PREVIEW_INVALID_TINT, "sunk": SUNK_TINT}
+
+def ship_atlas_for(lengths, cell):
+    """(length, orientation, state) -> ship sprite for every state in
+    SHIP_TINTS, tinted, turned and converted to the display format up front,
+    so drawing a ship is one plain blit"""
+    atlas = {}
+    for length in lengths:
+        vertical = ship_sprite(length, cell)
+        for orientation, img in (("vertical", vertical), ("horizontal", pygame.transform.rotate(vertical, 90))):
+            for state, tint in SHIP_TINTS.items():
+                sprite = img.copy()
+                if tint: sprite.fill(tint, special_flags=pygame.BLEND_RGBA_MULT)
+                atlas[length, orientation, state] = sprite.convert_alpha()
+    return atlas
+
+def marker_sprites(cell):
+    """Cell-sized HIT / MISS / RETICLE overlays. Lines and circles are drawn
+    once here, so frames only ever blit them (a clipped blit is exact, a
+    clipped thick line isn't quite)."""
+    def sprite():
+        return pygame.Surface((cell, cell), pygame.SRCALPHA)
+    hit = pygame.transform.scale(hit_raw, (cell, cell)) if hit_raw else sprite()
+    if not hit_raw: pygame.draw.circle(hit, HIT_COLOR, (cell // 2, cell // 2), cell // 4)
+
+    miss = sprite()
+    margin = cell // 8
+    width = max(2, cell // 10)
+    pygame.draw.line(miss, MISS_COLOR, (margin, margin), (cell - margin, cell - margin), width)
+    pygame.draw.line(miss, MISS_COLOR, (cell - margin, margin), (margin, cell - margin), width)
+
+    reticle = sprite()
+    c, radius = cell // 2, cell // 2 - 2
+    pygame.draw.circle(reticle, RETICLE_COLOR, (c, c), radius, 2)
+    pygame.draw.line(reticle, RETICLE_COLOR, (c - radius, c), (c + radius, c), 2)
+    pygame.draw.line(reticle, RETICLE_COLOR, (c, c - radius), (c, c + radius), 2)
+    return {"HIT": upright(hit), "MISS": upright(miss), "RETICLE": upright(reticle)}
+
+def preset_layout(grid_size, fleet):
+    """Window size, cell size, x offset and scaled sprites for a preset, worked
+    out the first time it is picked"""
+    key = (grid_size, tuple(sorted(set(fleet))))
+    if key not in preset_layouts:
+        view = min(grid_size, MAX_VIEW_CELLS)
+        cell = min(MAX_CELL_SIZE, GRID_AREA[0] // view, GRID_AREA[1] // view)
+        offset_x = (240 - view * cell) // 2
+        ships = ship_atlas_for([length for length in key[1] if length > 1], cell) if 3 in ship_raw else {}
+        markers = marker_sprites(cell)
+        preset_layouts[key] = (view, cell, offset_x, ships, markers)
+    return preset_layouts[key]
+
+def apply_preset(grid_size, fleet):
+    """Switch grid and fleet. Only ever called before ships are placed."""
+    global GRID_SIZE, SHIPS_TO_PLACE, FLEET_SAMPLER, VIEW_CELLS, CELL_SIZE, GRID_OFFSET_X
+    global ship_atlas, marker_assets, my_board, enemy_board, current_ship_length
+    global shooting_cursor_pos, view_origin
+    changed = (grid_size, list(fleet)) != (GRID_SIZE, SHIPS_TO_PLACE)
+    GRID_SIZE, SHIPS_TO_PLACE = grid_size, list(fleet)
+    VIEW_CELLS, CELL_SIZE, GRID_OFFSET_X, ship_atlas, marker_assets = preset_layout(GRID_SIZE, SHIPS_TO_PLACE)
+    if not changed: return
+    FLEET_SAMPLER = get_sampler(GRID_SIZE, SHIPS_TO_PLACE)
+    my_board = Board(GRID_SIZE)
+    enemy_board = Board(GRID_SIZE)
+    current_ship_length = SHIPS_TO_PLACE[0]
+    shooting_cursor_pos = (0, 0)
+    view_origin = (0, 0)
+    if SHOW_SHOT_ADVICE: start_advisor()
+    if ai_peer: ai_peer.prepare(GRID_SIZE, SHIPS_TO_PLACE)
+    print(f"GAME: Playing {GRID_SIZE}x{GRID_SIZE} with ships {SHIPS_TO_PLACE}")
+
+def start_advisor():
+    """(Re)build the shot advisor, and start loading the opening book, for the
+    current preset. Large-board mode gets neither."""
+    global shot_advisor, opening_book
+    if shot_advisor: shot_advisor.shutdown()
+    shot_advisor = opening_book = None
+    if GRID_SIZE * GRID_SIZE > SPARSE_MIN_CELLS: return
+    shot_advisor = ShotAdvisor(GRID_SIZE, SHIPS_TO_PLACE)
+    if SALVO_SIZE == 1: get_book(GRID_SIZE, SHIPS_TO_PLACE, wait=False)  # picked up by request_shot_advice
+
+def adopt_salvo_size(size):
+    """Take the master's SALVO_SIZE from its HELLO, like the preset"""
+    global SALVO_SIZE
+    if not isinstance(size, int) or size < 1 or size == SALVO_SIZE: return
+    SALVO_SIZE = size
+    if SHOW_SHOT_ADVICE: start_advisor()
+    print(f"GAME: Salvo size {SALVO_SIZE}")
+
+def select_preset(index):
+    global preset_index
+    preset_index = index % len(PRESETS)
+    _, grid_size, fleet = PRESETS[preset_index]
+    apply_preset(grid_size, fleet)
+
+for _, grid_size, fleet in PRESETS: preset_layout(grid_size, fleet)
+select_preset(preset_index)
 
 def send_data(data):
     global message_sequence
@@ -468,6 +739,7 @@ def receive_data():
         data = json.loads(rx_queue.get(block=False))
         if data and data.get("type") == "DISCONNECT":
             print("GAME: Received Disconnect Signal from Opponent.")
+            if snapshots: snapshots.discard()
             reset_game_state()
             return None
         return data
@@ -479,8 +751,8 @@ def receive_data():
 def trigger_explosion(grid_coord, label_text=None):
     global shake_end_time, flash_alpha
     
-    cx = GRID_OFFSET_X + grid_coord[0] * CELL_SIZE + CELL_SIZE // 2
-    cy = GRID_OFFSET_Y + grid_coord[1] * CELL_SIZE + CELL_SIZE // 2
+    x, y = cell_xy(grid_coord)
+    cx, cy = x + CELL_SIZE // 2, y + CELL_SIZE // 2
     
     is_miss = (label_text == "MISS!")
     
@@ -504,235 +776,268 @@ def trigger_explosion(grid_coord, label_text=None):
     if label_text:
         text_col = (255, 50, 50) 
         
-        txt_surf = FONT.render(label_text, True, text_col)
+        txt_surf = upright(FONT.render(label_text, True, text_col))
         floating_texts.append({
-            "x": cx - txt_surf.get_width() // 2,
+            "x": cx - portrait_size(txt_surf)[0] // 2,
             "y": cy - 20,
             "surf": txt_surf,
             "life": 255.0
         })
 
-def update_and_draw_vfx(surface):
-    global particles, flash_alpha, floating_texts
-    
+def step_vfx():
+    """Advance particles and floating labels by one frame"""
     for i in range(len(particles) - 1, -1, -1):
         p = particles[i]
         p["x"] += p["vx"]
         p["y"] += p["vy"]
         p["life"] -= 0.04 
-        
-        if p["life"] <= 0:
-            particles.pop(i)
-        else:
-            current_size = int(p["size"] * p["life"])
-            if current_size > 0:
-                rect = (int(p["x"] - current_size/2), int(p["y"] - current_size/2), current_size, current_size)
-                pygame.draw.rect(surface, p["color"], rect)
+        if p["life"] <= 0: particles.pop(i)
 
     for i in range(len(floating_texts) - 1, -1, -1):
         ft = floating_texts[i]
         ft["y"] -= 0.5 
-        
         ft["life"] -= 1.5 
-        
-        if ft["life"] <= 0:
-            floating_texts.pop(i)
-        else:
-            ft["surf"].set_alpha(int(ft["life"]))
-            surface.blit(ft["surf"], (ft["x"], ft["y"]))
+        if ft["life"] <= 0: floating_texts.pop(i)
+
+def particle_rect(p):
+    current_size = int(p["size"] * p["life"])
+    return pygame.Rect(int(p["x"] - current_size/2), int(p["y"] - current_size/2), current_size, current_size)
+
+def draw_vfx(surface):
+    for p in particles:
+        rect = particle_rect(p)
+        if rect.width > 0: surface.fill(p["color"], rect)
+
+    for ft in floating_texts:
+        ft["surf"].set_alpha(int(ft["life"]))
+        surface.blit(ft["surf"], (ft["x"], ft["y"]))
 
     if flash_alpha > 0:
-        flash_surf = pygame.Surface(surface.get_size())
-        flash_surf.fill((255, 255, 255))
         flash_surf.set_alpha(flash_alpha)
         surface.blit(flash_surf, (0, 0))
-        flash_alpha -= 15
 
 def get_ship_positions(start, length, orientation):
     x, y = start
     if orientation == "horizontal": return [(x + i, y) for i in range(length)]
     else: return [(x, y + i) for i in range(length)]
 
-def in_bounds(positions):
-    return all(0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE for x, y in positions)
-
-def ship_overlaps(positions, occupied):
-    return any(pos in occupied for pos in positions)
-
-def check_if_sunk(ship_parts):
-    return all(part["hit"] for part in ship_parts)
-
 def check_for_game_over():
-    return all(ship["sunk"] for ship in ship_positions.values())
-
-def get_ship_part_at(coord):
-    for ship in ship_positions.values():
-        for part in ship['parts']:
-            if part['pos'] == coord: return part
-    return None
+    return my_board.all_sunk()
 
 def draw_text(surface, text, pos, color=LINE_COLOR, font=SMALL_FONT):
-    text_surface = font.render(text, True, color)
-    surface.blit(text_surface, pos)
+    surface.blit(text_surface(font, text, color), pos)
+
+def text_surface(font, text, color):
+    return text_cache.get((id(font), text, color), lambda: upright(font.render(text, True, color)))
+
+def pulsed_text(font, text, color, scale):
+    """text scaled by a pulse, cached per whole-pixel size"""
+    w, h = pulse_size(font, text, scale)
+    return text_cache.get((id(font), text, color, w, h),
+                          lambda: upright(pygame.transform.scale(font.render(text, True, color), (w, h))))
+
+def draw_outline(surface, color, rect, width=1):
+    """Same pixels as pygame.draw.rect(surface, color, rect, width), but made
+    of fills, which clip cleanly. draw.rect outlines the clipped rect, so a
+    dirty rect cutting a cell would get a stray edge."""
+    x, y, w, h = rect
+    surface.fill(color, (x, y, w, width))
+    surface.fill(color, (x, y + h - width, w, width))
+    surface.fill(color, (x, y, width, h))
+    surface.fill(color, (x + w - width, y, width, h))
 
 def draw_icon(surface, shape, center_pos, size=15, color=ICON_COLOR):
     x, y = center_pos
     if shape == "RIGHT_ARROW":
         points = [(x - size//2, y - size//2), (x - size//2, y + size//2), (x + size//2, y)]
-        pygame.draw.polygon(surface, color, points)
+        surface.polygon(color, points)
     elif shape == "DOWN_ARROW":
         points = [(x - size//2, y - size//2), (x + size//2, y - size//2), (x, y + size//2)]
-        pygame.draw.polygon(surface, color, points)
+        surface.polygon(color, points)
 
 def draw_reticle(surface, cursor_pos):
-    cx = GRID_OFFSET_X + cursor_pos[0] * CELL_SIZE + CELL_SIZE // 2
-    cy = GRID_OFFSET_Y + cursor_pos[1] * CELL_SIZE + CELL_SIZE // 2
-    radius = CELL_SIZE // 2 - 2
-    
-    pygame.draw.circle(surface, RETICLE_COLOR, (cx, cy), radius, 2)
-    pygame.draw.line(surface, RETICLE_COLOR, (cx - radius, cy), (cx + radius, cy), 2)
-    pygame.draw.line(surface, RETICLE_COLOR, (cx, cy - radius), (cx, cy + radius), 2)
-
-def draw_miss_x(surface, coord):
-    x = GRID_OFFSET_X + coord[0] * CELL_SIZE
-    y = GRID_OFFSET_Y + coord[1] * CELL_SIZE
-    
-    margin = 5
-    pygame.draw.line(surface, MISS_COLOR, (x + margin, y + margin), (x + CELL_SIZE - margin, y + CELL_SIZE - margin), 4)
-    pygame.draw.line(surface, MISS_COLOR, (x + CELL_SIZE - margin, y + margin), (x + margin, y + CELL_SIZE - margin), 4)
-
-def draw_grid(is_shooting_board, cursor_pos=None, temp_ship_positions=None):
-    canvas = pygame.Surface((240, 320)) 
-    
-    canvas.fill(WATER_COLOR)
-    
-    if background_img:
-        wave_offset = -20 + math.sin(time.time() * 1.5) * 4
-        canvas.blit(background_img, (0, int(wave_offset)))
-    
-    for x in range(GRID_SIZE):
-        for y in range(GRID_SIZE):
-            rect = pygame.Rect(GRID_OFFSET_X + x * CELL_SIZE, GRID_OFFSET_Y + y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(canvas, LINE_COLOR, rect, 1) 
+    surface.blit(marker_assets["RETICLE"], cell_xy(cursor_pos))
+
+def follow(coord):
+    """Scroll the view just far enough to keep coord on screen"""
+    global view_origin
+    vx = min(max(view_origin[0], coord[0] - VIEW_CELLS + 1), coord[0])
+    vy = min(max(view_origin[1], coord[1] - VIEW_CELLS + 1), coord[1])
+    view_origin = (vx, vy)
+
+def cell_xy(coord):
+    """Canvas position of a cell's top-left corner under the current view"""
+    return (GRID_OFFSET_X + (coord[0] - view_origin[0]) * CELL_SIZE,
+            GRID_OFFSET_Y + (coord[1] - view_origin[1]) * CELL_SIZE)
+
+def draw_mark(surface, pos, result):
+    surface.blit(marker_assets["MISS" if result == "MISS" else "HIT"], pos)
+
+def draw_advice(surface, coord):
+    x, y = cell_xy(coord)
+    rect = pygame.Rect(x + 3, y + 3, CELL_SIZE - 6, CELL_SIZE - 6)
+    draw_outline(surface, ADVICE_COLOR, rect, 2)
+
+def request_shot_advice():
+    global shot_advice, opening_book
+    if shot_advisor and shot_advice is None:
+        if opening_book is None and SALVO_SIZE == 1:
+            opening_book = get_book(GRID_SIZE, SHIPS_TO_PLACE, wait=False)  # None while it is still loading
+        move = opening_book.shot(book_node) if opening_book else None
+        if move:
+            # Early game: the hint is a table lookup, no sampling needed
+            shot_advice = AdviceJob()
+            shot_advice.result = (move, None, 0)
+            shot_advice.ready.set()
+        else:
+            shot_advice = shot_advisor.start(enemy_board.hits, enemy_board.misses, enemy_board.pending,
+                                             enemy_board.sinks)
+
+def layer_xy(coord):
+    """Position of a cell's top-left corner on a grid-window layer"""
+    return ((coord[0] - view_origin[0]) * CELL_SIZE, (coord[1] - view_origin[1]) * CELL_SIZE)
+
+def new_layer():
+    span = VIEW_CELLS * CELL_SIZE
+    return Portrait(pygame.Surface((span, span), pygame.SRCALPHA))
+
+def grid_layer():
+    """Grid lines over the drawn window. Each cell has its own 1px outline,
+    so inner lines are 2px. Rebuilt only when the preset changes."""
+    key = (VIEW_CELLS, CELL_SIZE)
+    if layers.get("grid", (None,))[0] != key:
+        layer = new_layer()
+        span = VIEW_CELLS * CELL_SIZE
+        for k in range(VIEW_CELLS):
+            for edge in (k * CELL_SIZE, k * CELL_SIZE + CELL_SIZE - 1):
+                layer.fill(LINE_COLOR, (edge, 0, 1, span))
+                layer.fill(LINE_COLOR, (0, edge, span, 1))
+        layers["grid"] = (key, layer.surface)
+    return layers["grid"][1]
+
+def ships_layer():
+    """Our placed ships in the drawn window. Rebuilt when a ship is placed or
+    hit, or the view moves."""
+    key = (id(my_board), my_board.version, view_origin, CELL_SIZE)
+    if layers.get("ships", (None,))[0] != key:
+        layer = new_layer()
+        vx, vy = view_origin
+        for i, (head_x, head_y), length, orientation in my_board.ships_in(vx, vy, VIEW_CELLS, VIEW_CELLS):
+            img = ship_atlas.get((length, orientation, "sunk" if my_board.is_sunk(i) else "normal"))
+            if img:
+                layer.blit(img, layer_xy((head_x, head_y)))
+            else:
+                for cell in get_ship_positions((head_x, head_y), length, orientation):
+                    layer.fill((100,100,100), (*layer_xy(cell), CELL_SIZE, CELL_SIZE))
+        layers["ships"] = (key, layer.surface)
+    return layers["ships"][1]
+
+def marks_layer(board):
+    """Hit / miss marks in the drawn window. Shots resolved since the last
+    frame are blitted onto it; it is only redrawn from scratch when the view
+    moves."""
+    name = "shots" if board is enemy_board else "defence"
+    key = (id(board), view_origin, CELL_SIZE)
+    cached = layers.get(name)
+    if cached is None or cached[0] != key or cached[1] > len(board.marks):
+        layer = new_layer()
+        vx, vy = view_origin
+        for coord, result in board.marks_in(vx, vy, VIEW_CELLS, VIEW_CELLS):
+            draw_mark(layer, layer_xy(coord), result)
+    else:
+        _, seen, layer = cached
+        layer = Portrait(layer)
+        vx, vy = view_origin
+        for c in itertools.islice(board.marks, seen, None):
+            x, y = board.coord(c)
+            if vx <= x < vx + VIEW_CELLS and vy <= y < vy + VIEW_CELLS:
+                draw_mark(layer, layer_xy((x, y)), board.marks[c])
+    layers[name] = (key, len(board.marks), layer.surface)
+    return layer.surface
+
+def backdrop():
+    """Water, background at this frame's wave offset and grid lines, as one
+    pre-rendered frame"""
+    def build():
+        frame = Portrait(pygame.Surface(frame_surface.get_size()).convert())
+        frame.fill(WATER_COLOR)
+        if background_img: frame.blit(background_img, (0, wave_offset))
+        frame.blit(grid_layer(), (GRID_OFFSET_X, GRID_OFFSET_Y))
+        return frame.surface
+    return backdrop_cache.get((wave_offset, VIEW_CELLS, CELL_SIZE, GRID_OFFSET_X), build)
+
+def draw_grid(canvas, is_shooting_board, cursor_pos=None, show_preview=False):
+    # Only the VIEW_CELLS x VIEW_CELLS window is drawn, whatever GRID_SIZE is
+    canvas.blit(backdrop(), (0, 0))
+    origin = (GRID_OFFSET_X, GRID_OFFSET_Y)
             
     if not is_shooting_board:
-        for ship_name, ship_data in ship_positions.items():
-            parts = ship_data["parts"]
-            if not parts: continue
-            sorted_parts = sorted(parts, key=lambda p: (p['pos'][1], p['pos'][0]))
-            head_x, head_y = sorted_parts[0]['pos']
-            length = len(parts)
-            is_horizontal = False
-            if length > 1:
-                if sorted_parts[0]['pos'][1] == sorted_parts[1]['pos'][1]: 
-                    is_horizontal = True
-            
-            if length in ship_assets:
-                img = ship_assets[length]
-                if is_horizontal: img = pygame.transform.rotate(img, 90)
-                px = GRID_OFFSET_X + head_x * CELL_SIZE
-                py = GRID_OFFSET_Y + head_y * CELL_SIZE
-                canvas.blit(img, (px, py))
-            else:
-                for part in parts:
-                    cx, cy = part['pos']
-                    r = pygame.Rect(GRID_OFFSET_X + cx*CELL_SIZE, GRID_OFFSET_Y + cy*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                    pygame.draw.rect(canvas, (100,100,100), r)
-
-        if temp_ship_positions and game_state == "PLACING_SHIPS":
-            is_valid = in_bounds(temp_ship_positions) and not ship_overlaps(temp_ship_positions, occupied_placement)
-            if current_ship_length in ship_assets:
-                preview_img = ship_assets[current_ship_length].copy()
-                if current_ship_orientation == "horizontal":
-                    preview_img = pygame.transform.rotate(preview_img, 90)
-                
-                if not is_valid:
-                    tint = pygame.Surface(preview_img.get_size(), pygame.SRCALPHA)
-                    tint.fill((255, 0, 0, 100)) 
-                    preview_img.blit(tint, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-                else:
-                    preview_img.set_alpha(150)
-                
-                px = GRID_OFFSET_X + shooting_cursor_pos[0] * CELL_SIZE
-                py = GRID_OFFSET_Y + shooting_cursor_pos[1] * CELL_SIZE
+        canvas.blit(ships_layer(), origin)
+
+        if show_preview and game_state == "PLACING_SHIPS":
+            is_valid = placement_preview.valid
+            preview_img = ship_atlas.get((current_ship_length, current_ship_orientation,
+                                          "preview-valid" if is_valid else "preview-invalid"))
+            if preview_img:
+                px, py = cell_xy(shooting_cursor_pos)
                 canvas.blit(preview_img, (px, py))
             else:
                 fill_color = (150, 150, 150) if is_valid else INVALID_COLOR
-                for (tx, ty) in temp_ship_positions:
-                    r = pygame.Rect(GRID_OFFSET_X + tx*CELL_SIZE, GRID_OFFSET_Y + ty*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                    pygame.draw.rect(canvas, fill_color, r)
-                    pygame.draw.rect(canvas, LINE_COLOR, r, 1)
-
-    for x in range(GRID_SIZE):
-        for y in range(GRID_SIZE):
-            coord = (x, y)
-            if is_shooting_board and coord in shots_fired:
-                result = shots_fired[coord]
-                if result == "MISS": 
-                    draw_miss_x(canvas, coord)
-                elif result in ["HIT", "SUNK", "ALL_SUNK"]: 
-                    draw_marker(canvas, coord, HIT_COLOR)
-            elif not is_shooting_board:
-                ship_part = get_ship_part_at(coord)
-                if ship_part and ship_part['hit']:
-                    draw_marker(canvas, coord, HIT_COLOR)
-                elif coord in my_board_shots and my_board_shots[coord] == "MISS":
-                    draw_miss_x(canvas, coord)
+                for cell in placement_preview.cells:
+                    r = pygame.Rect(*cell_xy(cell), CELL_SIZE, CELL_SIZE)
+                    canvas.fill(fill_color, r)
+                    draw_outline(canvas, LINE_COLOR, r)
+
+    canvas.blit(marks_layer(enemy_board if is_shooting_board else my_board), origin)
 
     if cursor_pos:
         if is_shooting_board:
             draw_reticle(canvas, cursor_pos)
+            for coord in salvo_targets: draw_advice(canvas, coord)
         else:
-            rect = pygame.Rect(GRID_OFFSET_X + cursor_pos[0] * CELL_SIZE, GRID_OFFSET_Y + cursor_pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(canvas, CURSOR_COLOR, rect, 3)
-    
-    return canvas
-
-def draw_marker(surface, coord, color):
-    x = GRID_OFFSET_X + coord[0] * CELL_SIZE
-    y = GRID_OFFSET_Y + coord[1] * CELL_SIZE
-
-    if color == HIT_COLOR and "HIT" in marker_assets:
-         surface.blit(marker_assets["HIT"], (x, y))
-    else:
-         center_x = x + CELL_SIZE // 2
-         center_y = y + CELL_SIZE // 2
-         radius = CELL_SIZE // 4
-         pygame.draw.circle(surface, color, (center_x, center_y), radius)
+            rect = pygame.Rect(*cell_xy(cursor_pos), CELL_SIZE, CELL_SIZE)
+            draw_outline(canvas, CURSOR_COLOR, rect, 3)
 
 def update_start_screen_anim():
     global logo_y, blink_timer, show_blink
-    logo_y = logo_base_y + math.sin(time.time() * 5) * 5
+    logo_y = curve_at(LOGO_CURVE, 5, time.time())
     if time.time() - blink_timer > 0.8:
         show_blink = not show_blink
         blink_timer = time.time()
 
-def draw_start_screen():
-    canvas = pygame.Surface((240, 320))
+def draw_start_screen(canvas):
     canvas.fill((0, 0, 50)) 
-    logo_surf = BIG_FONT.render("BATTLESHIP", True, (255, 255, 255))
-    logo_rect = logo_surf.get_rect(center=(120, int(logo_y)))
-    canvas.blit(logo_surf, logo_rect)
+    logo_surf = text_surface(BIG_FONT, "BATTLESHIP", (255, 255, 255))
+    canvas.blit(logo_surf, centered(logo_surf, (120, int(logo_y))))
     if show_blink:
-        text_surf = FONT.render("Tap screen to start", True, (0, 255, 0))
-        text_rect = text_surf.get_rect(center=(120, 240)) 
-        canvas.blit(text_surf, text_rect)
-    pygame.draw.rect(canvas, (200, 0, 0), (160, 280, 70, 30))
+        text_surf = text_surface(FONT, "Tap screen to start", (0, 255, 0))
+        canvas.blit(text_surf, centered(text_surf, (120, 240)))
+    mode_surf = text_surface(FONT, PRESETS[preset_index][0], (255, 255, 255))
+    canvas.blit(mode_surf, centered(mode_surf, (120, 180)))
+    hint_surf = text_surface(SMALL_FONT, "RIGHT: change board", (150, 150, 200))
+    canvas.blit(hint_surf, centered(hint_surf, (120, 200)))
+    canvas.fill((200, 0, 0), (160, 280, 70, 30))
     draw_text(canvas, "QUIT", (175, 287), (255, 255, 255), SMALL_FONT)
-    return canvas
 
-def update_screen():
-    global screen, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
-    
+def shown_message():
+    if DISPLAY_MESSAGE and (game_state == "WAITING" or time.time() < MESSAGE_DISPLAY_TIME):
+        return DISPLAY_MESSAGE[:30]
+    return ""
+
+def advice_coord():
+    if shot_advice and shot_advice.ready.is_set() and shot_advice.result and not shot_fired:
+        return shot_advice.result[0]
+    return None
+
+def draw_frame(canvas):
+    """Draw the whole current frame. Only reads game state (update_screen
+    steps the animations first), so it can run once per dirty rect under a
+    clip and every pass sees the same frame."""
     if game_state == "START_SCREEN":
-        update_start_screen_anim()
-        canvas = draw_start_screen()
+        draw_start_screen(canvas)
     
     elif game_state == "PLACING_SHIPS":
-        temp_ship_positions = None
-        if not done_placing_ships:
-            temp_ship_positions = get_ship_positions(shooting_cursor_pos, current_ship_length, current_ship_orientation)
-        canvas = draw_grid(False, shooting_cursor_pos, temp_ship_positions)
+        draw_grid(canvas, False, shooting_cursor_pos, not done_placing_ships)
         status_text = f"Setup: {current_ship_length} ({current_ship_orientation[0].upper()})"
         draw_text(canvas, status_text, (60, 20), LINE_COLOR)
         draw_icon(canvas, "RIGHT_ARROW", (40, 290)) 
@@ -741,113 +1046,254 @@ def update_screen():
         draw_text(canvas, "Sel", (190, 283), ICON_COLOR) 
 
     elif game_state == "SHOOTING":
-        canvas = draw_grid(True, shooting_cursor_pos if not shot_fired else None)
+        draw_grid(canvas, True, shooting_cursor_pos if not shot_fired else None)
+        if advice_coord(): draw_advice(canvas, advice_coord())
         draw_text(canvas, "SHOOTING", (80, 20), LINE_COLOR)
         draw_icon(canvas, "RIGHT_ARROW", (40, 290)) 
         draw_icon(canvas, "DOWN_ARROW", (90, 290)) 
         draw_text(canvas, "Sel", (190, 283), ICON_COLOR) 
 
     elif game_state == "RECEIVING":
-        canvas = draw_grid(False)
+        draw_grid(canvas, False)
         draw_text(canvas, "RECEIVING", (80, 20), LINE_COLOR)
 
     else:
-        canvas = pygame.Surface((240, 320))
         canvas.fill(WATER_COLOR)
         if game_state == "WAITING": 
-            pulse_scale = 1.0 + 0.05 * math.sin(time.time() * 5)
-
             if status == Status.CONNECTED and not handshake_complete:
-                 text_surf = BIG_FONT.render("Syncing...", True, LINE_COLOR)
-                 canvas.blit(text_surf, text_surf.get_rect(center=(120, 140)))
+                 text_surf = text_surface(BIG_FONT, "Syncing...", LINE_COLOR)
+                 canvas.blit(text_surf, centered(text_surf, (120, 140)))
                  
-                 sub_surf = FONT.render("Wait for them...", True, (100,100,100))
-                 canvas.blit(sub_surf, sub_surf.get_rect(center=(120, 180)))
+                 sub_surf = text_surface(FONT, "Wait for them...", (100,100,100))
+                 canvas.blit(sub_surf, centered(sub_surf, (120, 180)))
             
             elif status == Status.CONNECTING:
-                 text_surf = BIG_FONT.render("Connecting...", True, LINE_COLOR)
-                 canvas.blit(text_surf, text_surf.get_rect(center=(120, 140)))
+                 text_surf = text_surface(BIG_FONT, "Connecting...", LINE_COLOR)
+                 canvas.blit(text_surf, centered(text_surf, (120, 140)))
                  
-                 sub_surf = FONT.render("Please wait...", True, (100,100,100))
-                 canvas.blit(sub_surf, sub_surf.get_rect(center=(120, 180)))
+                 sub_surf = text_surface(FONT, "Please wait...", (100,100,100))
+                 canvas.blit(sub_surf, centered(sub_surf, (120, 180)))
             
             else:
-                 text_surf = BIG_FONT.render("Searching...", True, LINE_COLOR)
-                 canvas.blit(text_surf, text_surf.get_rect(center=(120, 140)))
-                 
-                 base_sub = FONT.render("Tap NFC to Start", True, (100,100,100))
+                 text_surf = text_surface(BIG_FONT, "Searching...", LINE_COLOR)
+                 canvas.blit(text_surf, centered(text_surf, (120, 140)))
                  
-                 w = int(base_sub.get_width() * pulse_scale)
-                 h = int(base_sub.get_height() * pulse_scale)
-                 pulsed_sub = pygame.transform.scale(base_sub, (w, h))
-                 
-                 canvas.blit(pulsed_sub, pulsed_sub.get_rect(center=(120, 180)))
+                 pulsed_sub = pulsed_text(FONT, "Tap NFC to Start", (100,100,100), pulse_scale)
+                 canvas.blit(pulsed_sub, centered(pulsed_sub, (120, 180)))
         
         elif game_state == "DECIDING_FIRST_TURN": 
              pass
              
         elif game_state == "END": 
-            update_start_screen_anim() 
-            
             res_text = "VICTORY!" if not check_for_game_over() else "DEFEAT!"
             col = (0, 255, 0) if not check_for_game_over() else (255, 0, 0)
             
-            pulse_scale = 1.0 + 0.1 * math.sin(time.time() * 8)
-            
-            base_surf = HUGE_FONT.render(res_text, True, col)
-            new_w = int(base_surf.get_width() * pulse_scale)
-            new_h = int(base_surf.get_height() * pulse_scale)
-            res_surf = pygame.transform.scale(base_surf, (new_w, new_h))
-            
-            res_rect = res_surf.get_rect(center=(120, 120))
-            canvas.blit(res_surf, res_rect)
+            res_surf = pulsed_text(HUGE_FONT, res_text, col, pulse_scale)
+            canvas.blit(res_surf, centered(res_surf, (120, 120)))
             
             if show_blink:
-                reset_surf = FONT.render("Tap to Reset", True, LINE_COLOR)
-                reset_rect = reset_surf.get_rect(center=(120, 220))
-                canvas.blit(reset_surf, reset_rect)
+                reset_surf = text_surface(FONT, "Tap to Reset", LINE_COLOR)
+                canvas.blit(reset_surf, centered(reset_surf, (120, 220)))
 
-    if DISPLAY_MESSAGE and (game_state == "WAITING" or time.time() < MESSAGE_DISPLAY_TIME):
-        draw_text(canvas, DISPLAY_MESSAGE[:30], (10, 5), TEXT_COLOR)
+    message = shown_message()
+    if message: draw_text(canvas, message, (10, 5), TEXT_COLOR)
+
+    draw_vfx(canvas)
 
-    update_and_draw_vfx(canvas)
+def cell_rect(coord, width=1, height=1):
+    return pygame.Rect(*cell_xy(coord), CELL_SIZE * width, CELL_SIZE * height)
+
+def ship_rect(head, length, orientation):
+    horizontal = orientation == "horizontal"
+    return cell_rect(head, length if horizontal else 1, 1 if horizontal else length)
+
+def frame_regions():
+    """name -> (key, rects) for each part of the frame that can change on its
+    own. Whenever a key changes, the part's old and new rects are redrawn."""
+    regions = {"header": ((shown_message(), current_ship_length, current_ship_orientation), [HEADER_RECT])}
+    if game_state == "PLACING_SHIPS":
+        rects = [cell_rect(shooting_cursor_pos)]
+        if not done_placing_ships:
+            rects.append(ship_rect(shooting_cursor_pos, current_ship_length, current_ship_orientation))
+        regions["cursor"] = ((shooting_cursor_pos, current_ship_length, current_ship_orientation,
+                              placement_preview.valid, done_placing_ships), rects)
+    elif game_state == "SHOOTING":
+        cells = ([] if shot_fired else [shooting_cursor_pos]) + salvo_targets
+        if advice_coord(): cells.append(advice_coord())
+        regions["cursor"] = (tuple(cells), [cell_rect(c) for c in cells])
+    if game_state in ("PLACING_SHIPS", "RECEIVING"):
+        # a sunk ship switches to its sunk sprite, all of it, not just the cell hit
+        regions["sunk"] = (my_board.sunk_mask, [ship_rect(*ship) for i, ship in enumerate(my_board.ships)
+                                                if my_board.is_sunk(i)])
+    if game_state == "START_SCREEN":
+        regions["logo"] = (int(logo_y), [pygame.Rect(0, logo_base_y - 25, 240, 50)])
+        regions["blink"] = (show_blink, [pygame.Rect(0, 225, 240, 30)])
+    elif game_state == "WAITING":
+        regions["pulse"] = (pulse_size(FONT, "Tap NFC to Start", pulse_scale), [pygame.Rect(0, 165, 240, 30)])
+    elif game_state == "END":
+        regions["pulse"] = (pulse_size(HUGE_FONT, "DEFEAT!" if check_for_game_over() else "VICTORY!", pulse_scale),
+                            [pygame.Rect(0, 80, 240, 80)])
+        regions["blink"] = (show_blink, [pygame.Rect(0, 205, 240, 30)])
+
+    rects = [particle_rect(p) for p in particles]
+    rects = [rects[0].unionall(rects[1:])] if rects else []
+    # labels sit at fractional y, which blit rounds, so give them a pixel either side
+    rects += [pygame.Rect(int(ft["x"]) - 1, int(ft["y"]) - 1, *(n + 2 for n in portrait_size(ft["surf"])))
+              for ft in floating_texts]
+    fades = tuple(int(ft["life"]) for ft in floating_texts)
+    regions["vfx"] = ((tuple(map(tuple, rects)), fades), rects)
+    return regions
+
+def pulse_size(font, text, scale):
+    w, h = font.size(text)
+    return int(w * scale), int(h * scale)
+
+def new_cells(board, seen):
+    """Rects of the cells shot on board since it had seen marks"""
+    return [cell_rect(board.coord(c)) for c in itertools.islice(board.marks, seen, None)]
 
-    rotated_canvas = pygame.transform.rotate(canvas, 90)
+def update_screen():
+    """Step the animations, then redraw and push only the parts of the frame
+    that changed: full frames only on a state or view change, a background
+    wave step, a flash or a screen shake"""
+    global wave_offset, pulse_scale, flash_alpha, last_scene, last_regions, last_counts
     
+    if game_state in ("START_SCREEN", "END"): update_start_screen_anim()
+    if game_state in ("PLACING_SHIPS", "SHOOTING"): follow(shooting_cursor_pos)
+    if game_state == "PLACING_SHIPS" and not done_placing_ships:
+        placement_preview.update(my_board, shooting_cursor_pos, current_ship_length, current_ship_orientation)
+    step_vfx()
+    now = time.time()
+    wave_offset = curve_at(WAVE_CURVE, 1.5, now)
+    pulse_scale = curve_at(END_PULSE, 8, now) if game_state == "END" else curve_at(WAITING_PULSE, 5, now)
+
     shake_offset = (0, 0)
-    if time.time() < shake_end_time:
-        offset_x = random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
-        offset_y = random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
-        shake_offset = (offset_x, offset_y)
-        
-    screen.blit(rotated_canvas, shake_offset)
-    pygame.display.flip()
+    if now < shake_end_time:
+        shake_offset = (random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY),
+                        random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY))
+
+    scene = (game_state, status, handshake_complete, preset_index, GRID_SIZE, view_origin, id(my_board),
+             id(enemy_board), wave_offset if game_state in ("PLACING_SHIPS", "SHOOTING", "RECEIVING") else None,
+             shake_offset, flash_alpha)
+    counts = (len(my_board.ships), len(my_board.marks), len(enemy_board.marks))
+    regions = frame_regions()
+
+    if scene != last_scene or any(c < l for c, l in zip(counts, last_counts)):
+        dirty = [CANVAS_RECT]
+    else:
+        dirty = []
+        for name, (key, rects) in regions.items():
+            old_key, old_rects = last_regions.get(name, (None, []))
+            if key != old_key: dirty += old_rects + rects
+        if counts[0] != last_counts[0]:
+            dirty += [ship_rect(*ship) for ship in my_board.ships[last_counts[0]:]]
+        dirty += new_cells(my_board, last_counts[1]) + new_cells(enemy_board, last_counts[2])
+        dirty = [r.clip(CANVAS_RECT) for r in dirty]
+        dirty = merge_rects([r for r in dirty if r.width and r.height])
+    last_scene, last_regions, last_counts = scene, regions, counts
+
+    for rect in dirty:
+        frame_canvas.set_clip(rect)
+        draw_frame(frame_canvas)
+    frame_canvas.set_clip(None)
+    if flash_alpha > 0: flash_alpha -= 15
+    if not dirty: return
+
+    if dirty[0] is CANVAS_RECT:
+        screen.blit(frame_surface, shake_offset)
+        pygame.display.flip()
+        return
+    screen_rects = [frame_canvas.rect(rect) for rect in dirty]
+    for screen_rect in screen_rects:
+        screen.blit(frame_surface, screen_rect, screen_rect)
+    pygame.display.update(screen_rects)
+
+def merge_rects(rects):
+    """Fold overlapping rects together so no pixel is drawn or pushed twice"""
+    merged = []
+    for rect in rects:
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def start_screen_state():
+    if not GPIO.input(BUTTON_RIGHT):
+        select_preset(preset_index + 1)
+        time.sleep(0.2)
 
 def waiting_state():
-    global game_state, is_connected, handshake_sent, handshake_complete, DISPLAY_MESSAGE
+    global game_state, is_connected, handshake_sent, handshake_complete, DISPLAY_MESSAGE, game_started_at
+    global saved_game, hello_nonce, match_id
 
     if status == Status.CONNECTED:
         if not handshake_sent:
             print("GAME: Connected. Sending Handshake HELLO...")
-            send_data({"type": "HELLO"})
+            hello_nonce = random.getrandbits(32)
+            hello = {"type": "HELLO", "grid": GRID_SIZE, "fleet": SHIPS_TO_PLACE, "salvo": SALVO_SIZE,
+                     "nonce": hello_nonce}
+            saved_game = snapshots.read() if snapshots else None
+            if saved_game: hello["resume"] = saved_game.resume_key()
+            send_data(hello)
             handshake_sent = True
             DISPLAY_MESSAGE = "Syncing..."
         
         data = receive_data()
         if data and data.get("type") == "HELLO":
             print("GAME: Handshake Received! Sync Complete.")
+            if saved_game and saved_game.fits(data.get("resume"), peer_addr):
+                resume_game(saved_game)
+                return
+            nonce = data.get("nonce")
+            match_id = hello_nonce ^ (nonce if type(nonce) is int else 0) & 0xFFFFFFFF
+            if not IS_MASTER_PI and "grid" in data:
+                apply_preset(data["grid"], data["fleet"])
+                adopt_salvo_size(data.get("salvo", 1))
             handshake_complete = True
             
         if handshake_complete:
+            if saved_game: snapshots.discard()
+            saved_game = None
             is_connected = True
             game_state = "PLACING_SHIPS"
             DISPLAY_MESSAGE = "" 
+            if replay_log: replay_log.game_start(GRID_SIZE, GRID_SIZE)
+            game_started_at = time.time()
             print("GAME: Moving to PLACING_SHIPS")
 
+def save_snapshot():
+    """Called on entering SHOOTING or RECEIVING, when no shot is in flight"""
+    if snapshots:
+        snapshots.save(GameSnapshot(GRID_SIZE, SHIPS_TO_PLACE, game_state, my_board, enemy_board,
+                                    message_sequence, book_node, game_started_at, peer_addr, match_id))
+
+def resume_game(snap):
+    """Both sides have a snapshot of the same turn: carry on from there"""
+    global game_state, is_connected, handshake_complete, my_board, enemy_board, ship_placement_index
+    global message_sequence, book_node, game_started_at, saved_game, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
+    global match_id
+    apply_preset(snap.grid_size, snap.fleet)
+    my_board, enemy_board = snap.my_board, snap.enemy_board
+    ship_placement_index = len(SHIPS_TO_PLACE)
+    message_sequence = max(message_sequence, snap.message_sequence)
+    book_node = snap.book_node
+    game_started_at = snap.started_at
+    match_id = snap.match_id
+    handshake_complete = True
+    is_connected = True
+    game_state = snap.turn
+    saved_game = None
+    if replay_log: replay_log.resume(GRID_SIZE, GRID_SIZE)
+    DISPLAY_MESSAGE = "Game resumed!"
+    MESSAGE_DISPLAY_TIME = time.time() + 2.0
+    print(f"GAME: Resumed at {game_state} after {len(enemy_board.marks)} shots fired, {len(my_board.marks)} received")
+
 def placing_ships_state():
-    global done_placing_ships, shooting_cursor_pos, ship_positions, opponent_ready
+    global done_placing_ships, shooting_cursor_pos, opponent_ready
     global current_ship_length, current_ship_orientation, ship_placement_index
-    global occupied_placement, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
+    global DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
     
     if not done_placing_ships:
         x, y = shooting_cursor_pos
@@ -861,11 +1307,8 @@ def placing_ships_state():
             current_ship_orientation = "vertical" if current_ship_orientation == "horizontal" else "horizontal"
             time.sleep(0.2)
         elif not GPIO.input(BUTTON_SELECT):
-            ship_coords = get_ship_positions(shooting_cursor_pos, current_ship_length, current_ship_orientation)
-            if in_bounds(ship_coords) and not ship_overlaps(ship_coords, occupied_placement):
-                new_ship_name = f"ship_{ship_placement_index}"
-                ship_positions[new_ship_name] = {"parts": [{"pos": pos, "hit": False} for pos in ship_coords], "sunk": False}
-                occupied_placement.update(ship_coords)
+            if my_board.can_place(shooting_cursor_pos, current_ship_length, current_ship_orientation):
+                my_board.place_ship(shooting_cursor_pos, current_ship_length, current_ship_orientation)
                 ship_placement_index += 1
                 if ship_placement_index < len(SHIPS_TO_PLACE):
                     current_ship_length = SHIPS_TO_PLACE[ship_placement_index]
@@ -874,6 +1317,7 @@ def placing_ships_state():
                     done_placing_ships = True
                     DISPLAY_MESSAGE = "Waiting for opponent..."
                     MESSAGE_DISPLAY_TIME = time.time() + 2.0 
+                    record_fleet()
                     send_data({"type": "SHIPS_PLACED"})
             else:
                 DISPLAY_MESSAGE = "Invalid placement."
@@ -886,6 +1330,40 @@ def placing_ships_state():
             DISPLAY_MESSAGE = "Opponent Ready!"
             MESSAGE_DISPLAY_TIME = time.time() + 2.0 
 
+def auto_place_ships():
+    """Place whatever is left of the fleet, uniformly over the layouts that
+    complete it (close to uniform in large-board mode, see sampler.py)"""
+    global done_placing_ships, ship_placement_index, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
+    if done_placing_ships: return
+    picks = FLEET_SAMPLER.complete(my_board.fleet, SHIPS_TO_PLACE[ship_placement_index:])
+    if picks is None:
+        DISPLAY_MESSAGE = "Ships don't fit."
+        MESSAGE_DISPLAY_TIME = time.time() + 1.5
+        return
+    for start, length, orientation in picks:
+        my_board.place_ship(start, length, orientation)
+    ship_placement_index = len(SHIPS_TO_PLACE)
+    done_placing_ships = True
+    DISPLAY_MESSAGE = "Waiting for opponent..."
+    MESSAGE_DISPLAY_TIME = time.time() + 2.0
+    record_fleet()
+    send_data({"type": "SHIPS_PLACED"})
+
+def check_replay_log():
+    """Stop logging, and say so, once the replay writer has failed"""
+    global replay_log, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
+    if replay_log and replay_log.error:
+        print(f"GAME: Replay log stopped: {replay_log.error}")
+        replay_log.close()
+        replay_log = None
+        DISPLAY_MESSAGE = "Replay log failed"
+        MESSAGE_DISPLAY_TIME = time.time() + 2.0
+
+def record_fleet():
+    if replay_log:
+        for start, length, orientation in my_board.ships:
+            replay_log.place(start, length, orientation)
+
 def deciding_first_turn_state():
     global first_turn_started, first_turn_decided, has_first_turn, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME, waiting_for_opponent_ready
     
@@ -909,10 +1387,12 @@ def deciding_first_turn_state():
             first_turn_decided = True
 
 def shooting_state():
-    global shot_fired, shooting_result_received, shooting_cursor_pos, shots_fired
+    global shot_fired, shooting_result_received, shooting_cursor_pos
     global DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME, game_over, last_sent_shot, result_display_time
+    global shot_advice, salvo_targets, book_node
     
     if not shot_fired:
+        request_shot_advice()
         x, y = shooting_cursor_pos
         if not GPIO.input(BUTTON_RIGHT):
             shooting_cursor_pos = ((x + 1) % GRID_SIZE, y) 
@@ -922,10 +1402,14 @@ def shooting_state():
             time.sleep(0.2)
         elif not GPIO.input(BUTTON_SELECT):
             target_pos = (x, y)
-            if target_pos not in shots_fired:
+            if SALVO_SIZE > 1:
+                aim_salvo(target_pos)
+            elif not enemy_board.is_shot(target_pos):
                 shot_data = {"type": "SHOT", "coord": target_pos}
                 if send_data(shot_data):
-                    shots_fired[target_pos] = None 
+                    enemy_board.mark_pending(target_pos)
+                    if replay_log: replay_log.shot(OURS, target_pos)
+                    shot_advice = None
                     last_sent_shot = target_pos
                     shot_fired = True
                     DISPLAY_MESSAGE = "Firing..."
@@ -936,11 +1420,40 @@ def shooting_state():
             time.sleep(0.3)
     elif shot_fired and not shooting_result_received:
         data = receive_data()
-        if data and data.get("type") == "SHOT_RESULT":
+        if data and data.get("type") == "SALVO_RESULT" and salvo_targets:
+            results = decode_results(data.get("results", ""))
+            if [tuple(c) for c in data.get("coords", salvo_targets)] != salvo_targets: return  # a stale reply
+            if len(results) == len(salvo_targets):
+                for coord, result in zip(salvo_targets, results):
+                    enemy_board.record_result(coord, result)
+                    if result == "REPEAT": continue
+                    if replay_log: replay_log.result(OURS, coord, result)
+                    if result != "MISS": trigger_explosion(coord, "HIT!")
+                salvo_targets = []
+                if all(r == "REPEAT" for r in results):
+                    shot_fired = False
+                    DISPLAY_MESSAGE = "All shot already, aim again"
+                    MESSAGE_DISPLAY_TIME = time.time() + 2.0
+                    return
+                hits = sum(r in HIT_RESULTS for r in results)
+                DISPLAY_MESSAGE = f"Salvo: {hits}/{len(results)} hit"
+                MESSAGE_DISPLAY_TIME = time.time() + 2.0
+                result_display_time = time.time() + 2.0
+                if "ALL_SUNK" in results: game_over = True
+                shooting_result_received = True
+        elif data and data.get("type") == "SHOT_RESULT":
             shooting_result = data.get("result")
             coord = tuple(data.get("coord"))
-            if coord == last_sent_shot:
-                shots_fired[coord] = shooting_result 
+            if coord == last_sent_shot and shooting_result == "REPEAT":
+                enemy_board.record_result(coord, shooting_result)
+                shot_fired = False
+                DISPLAY_MESSAGE = "Already shot there!"
+                MESSAGE_DISPLAY_TIME = time.time() + 1.5
+            elif coord == last_sent_shot:
+                enemy_board.record_result(coord, shooting_result)
+                if replay_log: replay_log.result(OURS, coord, shooting_result)
+                if book_node is not None:  # a shot fired before the book loaded takes us out of book
+                    book_node = opening_book.child(book_node, coord, shooting_result) if opening_book else None
                 
                 display_text = shooting_result.replace("_", " ")
                 
@@ -952,35 +1465,93 @@ def shooting_state():
 
                 if shooting_result == "ALL_SUNK": game_over = True
                 shooting_result_received = True
+        elif data and data.get("type") == "ERROR":
+            # the opponent couldn't take our shot: nothing landed, so aim again
+            print(f"GAME: Opponent rejected our shot: {data.get('reason')}")
+            for coord in salvo_targets or [last_sent_shot]: enemy_board.cancel_pending(coord)
+            salvo_targets = []
+            shot_fired = False
+            DISPLAY_MESSAGE = "Shot rejected, aim again"
+            MESSAGE_DISPLAY_TIME = time.time() + 2.0
+
+def aim_salvo(target_pos):
+    """Add a cell to this turn's salvo (or take it back), and send the whole
+    salvo as one SHOT_BATCH once it has SALVO_SIZE shots or the board runs out"""
+    global shot_fired, shot_advice, DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME
+    if target_pos in salvo_targets:
+        salvo_targets.remove(target_pos)
+        return
+    if enemy_board.is_shot(target_pos):
+        DISPLAY_MESSAGE = "Already shot there!"
+        MESSAGE_DISPLAY_TIME = time.time() + 1.5
+        return
+    salvo_targets.append(target_pos)
+    unshot = GRID_SIZE * GRID_SIZE - len(enemy_board.marks)
+    if len(salvo_targets) < min(SALVO_SIZE, unshot):
+        DISPLAY_MESSAGE = f"Aimed {len(salvo_targets)}/{SALVO_SIZE}"
+        MESSAGE_DISPLAY_TIME = time.time() + 1.0
+        return
+    if send_data({"type": "SHOT_BATCH", "coords": salvo_targets}):
+        for coord in salvo_targets:
+            enemy_board.mark_pending(coord)
+            if replay_log: replay_log.shot(OURS, coord)
+        shot_advice = None
+        shot_fired = True
+        DISPLAY_MESSAGE = "Salvo away..."
+        MESSAGE_DISPLAY_TIME = time.time() + 1.5
 
 def receiving_state():
-    global shooting_result_sent, game_over, my_board_shots, processed_shot_coords
+    global shooting_result_sent, game_over
     global DISPLAY_MESSAGE, MESSAGE_DISPLAY_TIME, result_display_time
     
+    request_shot_advice()
     if shooting_result_sent: return 
     
     enemy_shot_data = receive_data()
-    if enemy_shot_data and enemy_shot_data.get("type") == "SHOT":
-        enemy_shot_coord = tuple(enemy_shot_data.get("coord"))
-        if enemy_shot_coord in processed_shot_coords: return 
-        processed_shot_coords.add(enemy_shot_coord)
-        
-        result = "MISS"
-        is_hit = False
-        for ship_name, ship_data in ship_positions.items():
-            if ship_data["sunk"]: continue
-            for part in ship_data["parts"]:
-                if part["pos"] == enemy_shot_coord and not part["hit"]:
-                    part["hit"] = True; is_hit = True
-                    if check_if_sunk(ship_data["parts"]):
-                        ship_data["sunk"] = True; result = "SUNK"
-                        if check_for_game_over(): game_over = True; result = "ALL_SUNK"
-                        break
-                    else: result = "HIT"
-                    break
-            if is_hit: break
+    if enemy_shot_data and enemy_shot_data.get("type") == "SHOT_BATCH":
+        coords = enemy_shot_data.get("coords")
+        if not isinstance(coords, list) or not 0 < len(coords) <= SALVO_SIZE or not all(map(my_board.on_board, coords)):
+            send_data({"type": "ERROR", "reason": f"bad SHOT_BATCH for salvo size {SALVO_SIZE}: {coords!r:.60}"})
+            return
+        coords = [tuple(c) for c in coords]
+        results = my_board.receive_salvo(coords)
+        reply = {"type": "SALVO_RESULT", "coords": coords, "results": encode_results(results)}
+        fresh = [(coord, result) for coord, result in zip(coords, results) if result != "REPEAT"]
+        if not fresh:
+            # Nothing new landed (or this is a late duplicate): say so, but
+            # keep waiting for the salvo that ends the turn
+            send_data(reply)
+            return
+        if replay_log:
+            for coord, result in fresh:
+                replay_log.shot(THEIRS, coord)
+                replay_log.result(THEIRS, coord, result)
+        if "ALL_SUNK" in results: game_over = True
+        follow(fresh[-1][0])
+        hits = sum(r in HIT_RESULTS for _, r in fresh)
+        DISPLAY_MESSAGE = f"Enemy salvo: {hits}/{len(fresh)} hit"
+        MESSAGE_DISPLAY_TIME = time.time() + 2.0
+        for coord, result in fresh:
+            trigger_explosion(coord, "HIT!" if result != "MISS" else "MISS!")
+        if send_data(reply):
+            shooting_result_sent = True
+            result_display_time = time.time() + 2.0
+    elif enemy_shot_data and enemy_shot_data.get("type") == "SHOT":
+        coord = enemy_shot_data.get("coord")
+        if not my_board.on_board(coord):
+            send_data({"type": "ERROR", "reason": f"bad SHOT: {coord!r:.60}"})
+            return
+        enemy_shot_coord = tuple(coord)
+        if my_board.is_shot(enemy_shot_coord):
+            send_data({"type": "SHOT_RESULT", "coord": enemy_shot_coord, "result": "REPEAT"})
+            return
         
-        my_board_shots[enemy_shot_coord] = result 
+        result = my_board.receive_shot(enemy_shot_coord)
+        if replay_log:
+            replay_log.shot(THEIRS, enemy_shot_coord)
+            replay_log.result(THEIRS, enemy_shot_coord, result)
+        if result == "ALL_SUNK": game_over = True
+        follow(enemy_shot_coord)
         
         display_text = result.replace("_", " ")
         
@@ -1018,24 +1589,41 @@ def next_state():
         if first_turn_decided and has_first_turn:
             game_state = "SHOOTING"
             first_turn_decided = False; waiting_for_opponent_ready = False
+            save_snapshot()
         elif first_turn_decided:
             game_state = "RECEIVING"
             first_turn_decided = False; waiting_for_opponent_ready = False
+            save_snapshot()
     elif game_state == "SHOOTING":
         if shot_fired and shooting_result_received and time.time() >= result_display_time:
-            if game_over: game_state = "END"
+            if game_over:
+                game_state = "END"
+                if replay_log: replay_log.game_end(OURS)
+                record_history(True)
+                if snapshots: snapshots.discard()
             else: game_state = "RECEIVING"
             shot_fired = False; shooting_result_received = False; result_display_time = 0
+            if game_state == "RECEIVING": save_snapshot()
     elif game_state == "RECEIVING":
         if shooting_result_sent and time.time() >= result_display_time:
-            if game_over: game_state = "END"; shooting_result_sent = False
-            else: game_state = "SHOOTING"; shooting_result_sent = False
+            if game_over:
+                game_state = "END"; shooting_result_sent = False
+                if replay_log: replay_log.game_end(THEIRS)
+                record_history(False)
+                if snapshots: snapshots.discard()
+            else: game_state = "SHOOTING"; shooting_result_sent = False; save_snapshot()
             result_display_time = 0
     elif game_state == "END":
         pass
 
+def record_history(won):
+    """Hand the finished game to the history writer thread; costs one queue put"""
+    if game_history:
+        peer = "computer" if ai_peer else (peer_addr or "unknown")
+        game_history.record(peer, won, GRID_SIZE, len(enemy_board.marks), len(my_board.marks), game_started_at)
+
 def perform_state():
-    if game_state == "START_SCREEN": pass
+    if game_state == "START_SCREEN": start_screen_state()
     elif game_state == "WAITING": waiting_state() 
     elif game_state == "PLACING_SHIPS": placing_ships_state()
     elif game_state == "DECIDING_FIRST_TURN": deciding_first_turn_state()
@@ -1048,15 +1636,30 @@ def run_glib_loop():
     except Exception: pass
 
 def main():
-    global reset_needed, game_state, running
+    global reset_needed, game_state, running, ai_peer, replay_log, game_history
+    global snapshots
+    
+    if REPLAY_PATH:
+        replay_log = ReplayWriter(REPLAY_PATH)
+    if HISTORY_DB:
+        game_history = GameHistory(HISTORY_DB)
+    if SNAPSHOT_PATH and not VS_COMPUTER:  # the computer keeps no snapshot of its own side
+        snapshots = SnapshotWriter(SNAPSHOT_PATH)
     
-    register_agent()
+    if SHOW_SHOT_ADVICE:
+        start_advisor()
     
-    threading.Thread(target=nfc_pipe_watcher, daemon=True).start()
-    threading.Thread(target=rfcomm_server, daemon=True).start()
-    threading.Thread(target=rfcomm_client, daemon=True).start()
-    threading.Thread(target=tx_queue_worker, daemon=True).start()
-    threading.Thread(target=run_glib_loop, daemon=True).start()
+    if VS_COMPUTER:
+        # The peer is the only consumer of tx_queue, so no radio threads at all
+        ai_peer = AIPeer(tx_queue, rx_queue, GRID_SIZE, SHIPS_TO_PLACE, SALVO_SIZE).start()
+    else:
+        register_agent()
+        
+        threading.Thread(target=nfc_pipe_watcher, daemon=True).start()
+        threading.Thread(target=rfcomm_server, daemon=True).start()
+        threading.Thread(target=rfcomm_client, daemon=True).start()
+        threading.Thread(target=tx_queue_worker, daemon=True).start()
+        threading.Thread(target=run_glib_loop, daemon=True).start()
     
     try:
         while running: 
@@ -1077,8 +1680,13 @@ def main():
                         else:
                             print("USER: Touch Start - OPENING CONNECTION GATE")
                             connection_enabled.set()
+                            if ai_peer: connect_ai_peer()
                             game_state = "WAITING"
                     
+                    elif game_state == "PLACING_SHIPS":
+                        print("USER: Touch Auto-Place")
+                        auto_place_ships()
+                    
                     elif game_state == "END":
                          print("USER: Tap to Reset Game")
                          reset_game_state()
@@ -1088,6 +1696,7 @@ def main():
             if reset_needed:
                 reset_game_state()
             
+            check_replay_log()
             next_state()
             perform_state()
             update_screen()
@@ -1117,6 +1726,11 @@ def main():
                 server_sock.close()
         except: pass
         
+        if shot_advisor: shot_advisor.shutdown()
+        if replay_log: replay_log.close()
+        if snapshots: snapshots.close()
+        if game_history: game_history.close()
+        
         try: pygame.quit()
         except: pass
         
@@ -0,0 +1,221 @@
+# board.py
+# Bitboard model shared by the battleship scripts. Cell (x, y) maps to bit
+# y * width + x, so fleet occupancy, per-ship masks, hits and misses are all
+# plain Python ints and every hit / sunk / all-sunk check is a couple of ANDs.
+#
+# Alongside the bitsets the board keeps sparse indexes (cell -> ship, cell ->
+# shot result, per-ship hits left), so placing, resolving a shot and finding
+# what to draw in a viewport cost the same on a 1000x1000 board as on a 5x5.
+
+HORIZONTAL = "horizontal"
+VERTICAL = "vertical"
+
+# One letter per shot in a SALVO_RESULT reply. REPEAT is a cell that had
+# already been shot (before, or earlier in the same batch): it changes nothing.
+RESULT_CODES = {"MISS": "M", "HIT": "H", "SUNK": "S", "ALL_SUNK": "A", "REPEAT": "R"}
+RESULT_NAMES = {code: name for name, code in RESULT_CODES.items()}
+HIT_RESULTS = ("HIT", "SUNK", "ALL_SUNK")
+
+def encode_results(results):
+    return "".join(RESULT_CODES[r] for r in results)
+
+def decode_results(codes):
+    return [RESULT_NAMES[c] for c in codes]
+
+def iter_bits(mask):
+    """Yield the index of every set bit in mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class Board:
+    def __init__(self, width, height=None):
+        self.width = width
+        self.height = width if height is None else height
+        self.fleet = 0
+        self.ships = []        # (start, length, orientation) in placement order
+        self.ship_masks = []
+        self.sunk_mask = 0     # bit i set once ship i is sunk
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0       # shots fired whose SHOT_RESULT hasn't arrived yet
+        self.sinks = 0         # shots fired that came back SUNK / ALL_SUNK
+        self.ship_at = {}      # cell index -> ship index
+        self.hp = []           # unhit cells left per ship
+        self.afloat = 0
+        self.marks = {}        # cell index -> "HIT" / "MISS", every resolved shot
+        self.version = 0       # bumped whenever a ship is placed or hit, for draw caches
+
+    # --- Coordinates ---
+
+    def bit(self, coord):
+        return 1 << (coord[1] * self.width + coord[0])
+
+    def coord(self, index):
+        return (index % self.width, index // self.width)
+
+    def coords(self, mask):
+        return [self.coord(i) for i in iter_bits(mask)]
+
+    def in_bounds(self, coord):
+        return 0 <= coord[0] < self.width and 0 <= coord[1] < self.height
+
+    def on_board(self, coord):
+        """Whether a coord off the wire is a well-formed [x, y] inside the board"""
+        return (isinstance(coord, (list, tuple)) and len(coord) == 2
+                and all(type(v) is int for v in coord) and self.in_bounds(coord))
+
+    def ship_mask(self, start, length, orientation):
+        """Bitmask covered by a ship, or 0 if any part is off the board"""
+        x, y = start
+        if orientation == HORIZONTAL:
+            if not (0 <= x and x + length <= self.width and 0 <= y < self.height): return 0
+            return ((1 << length) - 1) << (y * self.width + x)
+        if not (0 <= x < self.width and 0 <= y and y + length <= self.height): return 0
+        mask = 0
+        for i in range(length):
+            mask |= 1 << ((y + i) * self.width + x)
+        return mask
+
+    def ship_cells(self, start, length, orientation):
+        """Cell indices covered by a ship, or None if any part is off the board"""
+        x, y = start
+        if orientation == HORIZONTAL:
+            if not (0 <= x and x + length <= self.width and 0 <= y < self.height): return None
+            return range(y * self.width + x, y * self.width + x + length)
+        if not (0 <= x < self.width and 0 <= y and y + length <= self.height): return None
+        return range(y * self.width + x, (y + length) * self.width + x, self.width)
+
+    # --- Placement ---
+
+    def can_place(self, start, length, orientation):
+        cells = self.ship_cells(start, length, orientation)
+        return cells is not None and not any(c in self.ship_at for c in cells)
+
+    def place_ship(self, start, length, orientation):
+        if not self.can_place(start, length, orientation): return False
+        i = len(self.ships)
+        for c in self.ship_cells(start, length, orientation):
+            self.ship_at[c] = i
+        mask = self.ship_mask(start, length, orientation)
+        self.ships.append((start, length, orientation))
+        self.ship_masks.append(mask)
+        self.hp.append(length)
+        self.afloat += 1
+        self.fleet |= mask
+        self.version += 1
+        return True
+
+    def legal_starts(self, length, orientation):
+        """Bitmask of every start cell where a ship of this length and
+        orientation fits around the ships placed so far. Only the starts
+        blocked by placed ship cells are walked, never the whole board."""
+        w, h = self.width, self.height
+        if orientation == HORIZONTAL:
+            if length > w: return 0
+            # one row of starts, doubled up until it covers all h rows
+            legal, rows = (1 << (w - length + 1)) - 1, 1
+            while rows < h:
+                more = min(rows, h - rows)
+                legal |= (legal & ((1 << (more * w)) - 1)) << (rows * w)
+                rows += more
+        else:
+            if length > h: return 0
+            legal = (1 << ((h - length + 1) * w)) - 1
+        blocked = bytearray((w * h + 7) // 8)
+        for c in self.ship_at:
+            if orientation == HORIZONTAL: starts = range(c, c - min(length, c % w + 1), -1)
+            else: starts = range(c, max(c - length * w, -1), -w)
+            for s in starts: blocked[s >> 3] |= 1 << (s & 7)
+        return legal & ~int.from_bytes(blocked, "little")
+
+    def has_ship(self, coord):
+        return coord[1] * self.width + coord[0] in self.ship_at
+
+    # --- Shots against this board (our own fleet) ---
+
+    def receive_shot(self, coord):
+        """Resolve an enemy shot and return MISS / HIT / SUNK / ALL_SUNK"""
+        c = coord[1] * self.width + coord[0]
+        i = self.ship_at.get(c)
+        if i is None or self.marks.get(c) == "HIT":
+            if c not in self.marks:
+                self.misses |= 1 << c
+                self.marks[c] = "MISS"
+            return "MISS"
+        self.hits |= 1 << c
+        self.marks[c] = "HIT"
+        self.version += 1
+        self.hp[i] -= 1
+        if self.hp[i]: return "HIT"
+        self.sunk_mask |= 1 << i
+        self.afloat -= 1
+        return "ALL_SUNK" if self.all_sunk() else "SUNK"
+
+    def receive_salvo(self, coords):
+        """Resolve a SHOT_BATCH in one pass, in order. A cell shot before, or
+        earlier in the batch, comes back as REPEAT. Cells shot after ALL_SUNK
+        come back as MISS."""
+        return ["REPEAT" if self.is_shot(c) else self.receive_shot(c) for c in coords]
+
+    def is_sunk(self, ship_index):
+        return bool(self.sunk_mask >> ship_index & 1)
+
+    def all_sunk(self):
+        return self.afloat == 0
+
+    # --- Shots fired by us (tracking the enemy board) ---
+
+    def mark_pending(self, coord):
+        self.pending |= self.bit(coord)
+
+    def cancel_pending(self, coord):
+        self.pending &= ~self.bit(coord)
+
+    def record_result(self, coord, result):
+        """Resolve one of our shots. A REPEAT only clears it from pending."""
+        b = self.bit(coord)
+        self.pending &= ~b
+        c = coord[1] * self.width + coord[0]
+        if result == "MISS":
+            self.misses |= b
+            self.marks[c] = "MISS"
+        elif result in HIT_RESULTS:
+            self.hits |= b
+            if result != "HIT": self.sinks |= b
+            self.marks[c] = "HIT"
+
+    # --- Queries ---
+
+    def is_hit(self, coord):
+        return self.marks.get(coord[1] * self.width + coord[0]) == "HIT"
+
+    def is_miss(self, coord):
+        return self.marks.get(coord[1] * self.width + coord[0]) == "MISS"
+
+    def is_shot(self, coord):
+        return coord[1] * self.width + coord[0] in self.marks or bool(self.pending & self.bit(coord))
+
+    # --- Viewports ---
+
+    def marks_in(self, x0, y0, w, h):
+        """(coord, "HIT" / "MISS") for every resolved shot inside a w x h window.
+        Costs min(shots, window cells), never the board area."""
+        x1, y1 = min(x0 + w, self.width), min(y0 + h, self.height)
+        if len(self.marks) < w * h:
+            for c, result in self.marks.items():
+                x, y = c % self.width, c // self.width
+                if x0 <= x < x1 and y0 <= y < y1: yield (x, y), result
+            return
+        for y in range(max(y0, 0), y1):
+            for x in range(max(x0, 0), x1):
+                result = self.marks.get(y * self.width + x)
+                if result: yield (x, y), result
+
+    def ships_in(self, x0, y0, w, h):
+        """Ships (index, start, length, orientation) that overlap a w x h window"""
+        for i, ((sx, sy), length, orientation) in enumerate(self.ships):
+            ex, ey = (sx + length, sy + 1) if orientation == HORIZONTAL else (sx + 1, sy + length)
+            if sx < x0 + w and ex > x0 and sy < y0 + h and ey > y0:
+                yield i, (sx, sy), length, orientation
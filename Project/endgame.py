@@ -0,0 +1,295 @@
+# endgame.py
+# Exact endgame solver. A position is the set of enemy fleet layouts still
+# consistent with every SHOT_RESULT so far, plus the cells already hit. The
+# solver picks the shot that minimises the expected number of shots to
+# ALL_SUNK, memoizing solved positions in a bounded LRU transposition table
+# keyed by the position's canonical form under the 8 symmetries of the grid.
+#
+# best_shot returns None when the position has too many layouts or its budget
+# runs out, so callers can fall back to a heuristic. The budget is a latency
+# (ENDGAME_BUDGET) or, for runs that have to replay exactly, a count of work
+# units: one per position expanded or shot weighed, and one per CHECK_EVERY
+# layouts scanned.
+#
+# Listing every layout up front takes a second or more on 6x6, so get_solver
+# does it on a background thread, and is skipped outright when the sampler's
+# exact count says there are too many. best_shot returns None until then.
+#
+# Boards too big to enumerate register layouts as positions turn them up. Once
+# the registry passes REGISTRY_MAX, layouts that no longer fit the current
+# hits and misses are dropped. The table goes with them, since its keys refer
+# to layout ids.
+
+from collections import OrderedDict, Counter
+from math import factorial
+import threading
+import time
+
+from board import iter_bits
+from placements import get_index
+from sampler import get_sampler
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+ENDGAME_BUDGET = 0.010          # seconds per best_shot call
+ENDGAME_NODES = 200             # work units per best_shot call for deterministic runs, ~10 ms on 5x5
+CHECK_EVERY = 256               # layouts scanned per work unit (and budget check)
+MAX_LAYOUTS = 20                # only solve positions with at most this many layouts
+TABLE_SIZE = 200000             # transposition table entries
+FULL_ENUM_MAX_CELLS = 49        # enumerate every layout up front (and use symmetry) up to 7x7
+FULL_ENUM_MAX_LAYOUTS = 200000
+REGISTRY_MAX = 2000             # registered layouts kept before stale ones are evicted
+
+_solvers = {}
+_solvers_lock = threading.Lock()
+
+class OutOfTime(Exception):
+    pass
+
+def get_solver(grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, wait=True):
+    """Shared solver per grid/fleet so the transposition table carries over
+    between games. With wait=False it comes back while still listing layouts."""
+    key = (grid_size, tuple(sorted(fleet)))
+    with _solvers_lock:
+        solver = _solvers.get(key)
+        if solver is None:
+            solver = _solvers[key] = EndgameSolver(grid_size, fleet, background=True)
+    if wait: solver.ready.wait()
+    return solver
+
+def shot_outcome(ship_masks, union, hits, b):
+    """Result a layout would report for a shot at bit b, given the cells already hit"""
+    if not union & b: return "MISS"
+    after = hits | b
+    if union & ~after == 0: return "ALL_SUNK"
+    for m in ship_masks:
+        if m & b: return "SUNK" if m & ~after == 0 else "HIT"
+    return "HIT"
+
+def consistent(ship_masks, union, history, bit):
+    hits = 0
+    for coord, result in history:
+        b = bit(coord)
+        if shot_outcome(ship_masks, union, hits, b) != result: return False
+        if result != "MISS": hits |= b
+    return True
+
+class EndgameSolver:
+    def __init__(self, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, table_size=TABLE_SIZE, background=False):
+        self.grid_size = grid_size
+        self.fleet = sorted(fleet, reverse=True)
+        self.index = get_index(grid_size, fleet)
+        self.table = OrderedDict()
+        self.table_size = table_size
+        self.layouts = []       # id -> (ship masks, union)
+        self.layout_ids = {}    # ship masks -> id
+        self.cell_perms = [list(range(grid_size * grid_size))]
+        self.layout_perms = None
+        self.deadline = None
+        self.nodes_left = None
+        self.ready = threading.Event()  # set once the up-front enumeration is done or skipped
+        if background: threading.Thread(target=self._build, daemon=True).start()
+        else: self._build()
+
+    def bit(self, coord):
+        return 1 << (coord[1] * self.grid_size + coord[0])
+
+    def _spend(self, nodes=1):
+        """Charge work against the best_shot budget, raising OutOfTime once it is gone"""
+        if self.nodes_left is not None:
+            self.nodes_left -= nodes
+            if self.nodes_left < 0: raise OutOfTime
+        if self.deadline and time.perf_counter() > self.deadline: raise OutOfTime
+
+    # --- Layouts ---
+
+    def _register(self, ship_masks):
+        key = tuple(sorted(ship_masks))
+        i = self.layout_ids.get(key)
+        if i is None:
+            union = 0
+            for m in key: union |= m
+            i = self.layout_ids[key] = len(self.layouts)
+            self.layouts.append((key, union))
+        return i
+
+    def _evict(self, hits, misses):
+        """Keep only the layouts that still fit the hits and misses, renumbered"""
+        kept = [(ships, union) for ships, union in self.layouts if not (union & misses or hits & ~union)]
+        self.layouts = kept
+        self.layout_ids = {ships: i for i, (ships, _) in enumerate(kept)}
+        self.table.clear()
+
+    def _layouts(self, misses, hits, limit):
+        """Yield ship-mask tuples avoiding misses, with equal-length ships in
+        ascending row order so every layout comes out exactly once"""
+        options = []
+        for length in self.fleet:
+            first, end = self.index.span(length)
+            options.append([(r, self.index.mask(r)) for r in range(first, end) if not self.index.mask(r) & misses])
+        found = visited = 0
+        def dfs(i, occupied, chosen, min_row):
+            nonlocal found, visited
+            visited += 1
+            if visited % CHECK_EVERY == 0: self._spend()
+            if i == len(self.fleet):
+                if hits & ~occupied: return
+                found += 1
+                if found > limit: raise OutOfTime
+                yield tuple(m for _, m in chosen)
+                return
+            same = i > 0 and self.fleet[i] == self.fleet[i - 1]
+            for r, m in options[i]:
+                if same and r <= min_row: continue
+                if m & occupied: continue
+                chosen.append((r, m))
+                yield from dfs(i + 1, occupied | m, chosen, r)
+                chosen.pop()
+        yield from dfs(0, 0, [], -1)
+
+    def _build(self):
+        try:
+            if self._enumerable(): self._enumerate_all()
+        finally:
+            self.ready.set()
+
+    def _enumerable(self):
+        """Small enough board, and few enough layouts by the sampler's exact count"""
+        if self.grid_size * self.grid_size > FULL_ENUM_MAX_CELLS: return False
+        prefix = get_sampler(self.grid_size, self.fleet).prefix
+        if prefix is None: return False
+        same = 1  # the sampler tells ships of the same length apart, the solver doesn't
+        for n in Counter(self.fleet).values(): same *= factorial(n)
+        return prefix.total // same <= FULL_ENUM_MAX_LAYOUTS
+
+    def _enumerate_all(self):
+        try:
+            for ships in self._layouts(0, 0, FULL_ENUM_MAX_LAYOUTS):
+                self._register(ships)
+        except OutOfTime:
+            self.layouts, self.layout_ids = [], {}
+            return
+        n = self.grid_size
+        transforms = [lambda x, y: (x, y), lambda x, y: (n - 1 - x, y), lambda x, y: (x, n - 1 - y),
+                      lambda x, y: (n - 1 - x, n - 1 - y), lambda x, y: (y, x), lambda x, y: (n - 1 - y, x),
+                      lambda x, y: (y, n - 1 - x), lambda x, y: (n - 1 - y, n - 1 - x)]
+        self.cell_perms = []
+        for t in transforms:
+            perm = []
+            for c in range(n * n):
+                x, y = t(c % n, c // n)
+                perm.append(y * n + x)
+            self.cell_perms.append(perm)
+        self.layout_perms = []
+        for perm in self.cell_perms:
+            self.layout_perms.append([self.layout_ids[tuple(sorted(self._map_mask(m, perm) for m in ships))]
+                                      for ships, _ in self.layouts])
+
+    def _map_mask(self, mask, perm):
+        out = 0
+        for c in iter_bits(mask): out |= 1 << perm[c]
+        return out
+
+    def candidates(self, hits, misses, history):
+        """Bitset of layout ids consistent with the observations, or None if too many"""
+        s, count = 0, 0
+        if self.layout_perms is not None:
+            for i, (ships, union) in enumerate(self.layouts):
+                if i % CHECK_EVERY == 0: self._spend()
+                if union & misses or hits & ~union: continue
+                if history and not consistent(ships, union, history, self.bit): continue
+                s |= 1 << i
+                count += 1
+                if count > MAX_LAYOUTS: return None
+            return s
+        if len(self.layouts) > REGISTRY_MAX: self._evict(hits, misses)
+        try:
+            for ships in self._layouts(misses, hits, MAX_LAYOUTS * 50):
+                union = 0
+                for m in ships: union |= m
+                if history and not consistent(ships, union, history, self.bit): continue
+                s |= 1 << self._register(ships)
+                count += 1
+                if count > MAX_LAYOUTS: return None
+        except OutOfTime:
+            return None
+        return s
+
+    # --- Search ---
+
+    def _key(self, hits, s):
+        if self.layout_perms is None: return (hits, s)
+        best = None
+        for perm, lperm in zip(self.cell_perms, self.layout_perms):
+            k = (self._map_mask(hits, perm), sum(1 << lperm[i] for i in iter_bits(s)))
+            if best is None or k < best: best = k
+        return best
+
+    def _lower_bound(self, hits, s, n):
+        return sum(bin(self.layouts[i][1] & ~hits).count("1") for i in iter_bits(s)) / n
+
+    def _split(self, hits, s, b):
+        groups = {}
+        for i in iter_bits(s):
+            ships, union = self.layouts[i]
+            o = shot_outcome(ships, union, hits, b)
+            groups[o] = groups.get(o, 0) | 1 << i
+        return groups
+
+    def _value(self, hits, s):
+        key = self._key(hits, s)
+        v = self.table.get(key)
+        if v is not None:
+            self.table.move_to_end(key)
+            return v
+        self._spend()
+        n = bin(s).count("1")
+        open_cells = 0
+        for i in iter_bits(s): open_cells |= self.layouts[i][1]
+        open_cells &= ~hits
+        best = float("inf")
+        for c in iter_bits(open_cells):
+            v = self._shot_value(hits, s, n, 1 << c, best)
+            if v < best: best = v
+        self.table[key] = best
+        if len(self.table) > self.table_size: self.table.popitem(last=False)
+        return best
+
+    def _shot_value(self, hits, s, n, b, cutoff):
+        self._spend()
+        groups = self._split(hits, s, b)
+        bounds = {o: (0 if o == "ALL_SUNK" else self._lower_bound(hits | (b if o != "MISS" else 0), g, n)) for o, g in groups.items()}
+        total = 1 + sum(bounds.values())
+        if total >= cutoff: return total
+        for o, g in groups.items():
+            if o == "ALL_SUNK": continue
+            child_hits = hits | b if o != "MISS" else hits
+            total += bin(g).count("1") / n * self._value(child_hits, g) - bounds[o]
+            if total >= cutoff: return total
+        return total
+
+    def best_shot(self, hits, misses, history=(), budget=ENDGAME_BUDGET, nodes=None):
+        """(coord, expected shots to finish) for the optimal next shot, or None
+        when the position is too big, the budget (seconds, and/or nodes work
+        units) runs out or the layouts are still being listed"""
+        if not self.ready.is_set(): return None
+        self.deadline = time.perf_counter() + budget if budget else None
+        self.nodes_left = nodes
+        try:
+            s = self.candidates(hits, misses, history)
+            if not s: return None
+            n = bin(s).count("1")
+            open_cells = 0
+            for i in iter_bits(s): open_cells |= self.layouts[i][1]
+            open_cells &= ~hits
+            best, best_cell = float("inf"), None
+            for c in iter_bits(open_cells):
+                v = self._shot_value(hits, s, n, 1 << c, best)
+                if v < best: best, best_cell = v, c
+        except OutOfTime:
+            return None
+        finally:
+            self.deadline = self.nodes_left = None
+        if best_cell is None: return None
+        return (best_cell % self.grid_size, best_cell // self.grid_size), best
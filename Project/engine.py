@@ -0,0 +1,119 @@
+# engine.py
+# Headless match engine. Plays full games between two Player objects using the
+# same rules as the pygame scripts (master shoots first, SHOT -> MISS / HIT /
+# SUNK / ALL_SUNK, game over on ALL_SUNK) with no display, GPIO or RFCOMM.
+#
+#   python3 engine.py [games]      # random vs random load test
+
+import random
+import sys
+import time
+
+from board import Board
+from sampler import get_sampler
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+def random_fleet(board, fleet, rng=random):
+    """Place every ship in fleet on an empty board, uniformly over all layouts
+    (approximately on boards sampler.py can't sample exactly)"""
+    for start, length, orientation in get_sampler(board.width, fleet).complete(rng=rng):
+        board.place_ship(start, length, orientation)
+    return board
+
+class Player:
+    """Base class for anything that can play a match. Subclasses override
+    place_ships and choose_shot; the two callbacks are optional."""
+    name = "player"
+
+    def new_game(self, width, height, fleet, rng):
+        self.width, self.height, self.fleet, self.rng = width, height, list(fleet), rng
+        self.salvoed = set()    # cells handed out by the default choose_salvo
+
+    def place_ships(self, board):
+        raise NotImplementedError
+
+    def choose_shot(self):
+        raise NotImplementedError
+
+    def choose_salvo(self, k):
+        """Up to k different shots to fire together before any result comes
+        back. The default asks choose_shot, which gets no results in between
+        and may pick a cell twice, so repeats (in this salvo or an earlier one)
+        are dropped and the salvo is topped up with random unfired cells.
+        Players that rank cells should override it."""
+        salvo = []
+        for _ in range(2 * k):
+            if len(salvo) == k: break
+            coord = tuple(self.choose_shot())
+            if coord not in self.salvoed and coord not in salvo: salvo.append(coord)
+        if len(salvo) < k:
+            taken = self.salvoed.union(salvo)
+            left = [(x, y) for y in range(self.height) for x in range(self.width) if (x, y) not in taken]
+            salvo += self.rng.sample(left, min(k - len(salvo), len(left)))
+        self.salvoed.update(salvo)
+        return salvo
+
+    def shot_result(self, coord, result):
+        pass
+
+    def opponent_shot(self, coord, result):
+        pass
+
+class RandomPlayer(Player):
+    name = "random"
+
+    def new_game(self, width, height, fleet, rng):
+        super().new_game(width, height, fleet, rng)
+        self.targets = [(x, y) for y in range(height) for x in range(width)]
+        rng.shuffle(self.targets)
+
+    def place_ships(self, board):
+        random_fleet(board, self.fleet, self.rng)
+
+    def choose_shot(self):
+        return self.targets.pop()
+
+def play_match(players, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, rng=None, first=0, history=None):
+    """Play one game to ALL_SUNK. Returns {"winner", "turns", "shots", "boards"}
+    where turns is the number of shots the winner fired. If history is a list,
+    every (shooter, coord, result) is appended to it."""
+    rng = rng or random.Random()
+    boards = [Board(grid_size), Board(grid_size)]
+    tracking = [Board(grid_size), Board(grid_size)]
+    for i, player in enumerate(players):
+        player.new_game(grid_size, grid_size, fleet, rng)
+        player.place_ships(boards[i])
+        if sorted(l for _, l, _ in boards[i].ships) != sorted(fleet):
+            raise ValueError(f"{player.name} placed {boards[i].ships}, expected fleet {fleet}")
+
+    turns = [0, 0]
+    shooter = first
+    limit = 2 * grid_size * grid_size
+    for _ in range(limit):
+        defender = 1 - shooter
+        coord = tuple(players[shooter].choose_shot())
+        if not tracking[shooter].in_bounds(coord) or tracking[shooter].is_shot(coord):
+            raise ValueError(f"{players[shooter].name} fired illegal shot {coord}")
+        result = boards[defender].receive_shot(coord)
+        tracking[shooter].record_result(coord, result)
+        turns[shooter] += 1
+        players[shooter].shot_result(coord, result)
+        players[defender].opponent_shot(coord, result)
+        if history is not None: history.append((shooter, coord, result))
+        if result == "ALL_SUNK":
+            return {"winner": shooter, "turns": turns[shooter], "shots": sum(turns), "boards": boards}
+        shooter = defender
+    raise RuntimeError("match did not finish")
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(0)
+    players = [RandomPlayer(), RandomPlayer()]
+    wins = [0, 0]
+    start = time.perf_counter()
+    for _ in range(games):
+        wins[play_match(players, rng=rng)["winner"]] += 1
+    elapsed = time.perf_counter() - start
+    print(f"{games} games in {elapsed:.2f}s ({games / elapsed:.0f} games/s), first player won {wins[0]}")
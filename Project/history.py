@@ -0,0 +1,146 @@
+# history.py
+# Local store of finished games in SQLite. The game loop only ever puts a row
+# on a queue; a background thread drains it and inserts whatever has built up
+# in one transaction. The database runs in WAL mode with synchronous=FULL, so
+# a committed game survives the kiosk being unplugged, and queries from other
+# connections never wait on the writer.
+#
+#   python3 history.py [history.db] [peer address]   # win rate, streak, head to head
+
+import sys
+import time
+import queue
+import sqlite3
+import threading
+
+HISTORY_DB = "history.db"
+BATCH_MAX = 500  # rows per transaction at most
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    peer TEXT NOT NULL,
+    outcome TEXT NOT NULL CHECK (outcome IN ('WIN', 'LOSS')),
+    grid_size INTEGER NOT NULL,
+    our_shots INTEGER NOT NULL,
+    their_shots INTEGER NOT NULL
+);
+-- Covering indexes: every query below is answered from an index alone
+CREATE INDEX IF NOT EXISTS games_peer ON games (peer, finished_at, outcome, our_shots);
+CREATE INDEX IF NOT EXISTS games_finished ON games (finished_at, outcome);
+CREATE INDEX IF NOT EXISTS games_outcome ON games (outcome, finished_at, peer);
+"""
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=5.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    return conn
+
+class GameHistory:
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        conn = connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self.reader = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # --- Writing ---
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            rows = [self.queue.get()]
+            try:
+                while len(rows) < BATCH_MAX: rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            closing = rows[-1] is None
+            rows = [r for r in rows if r is not None]
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO games (started_at, finished_at, peer, outcome, grid_size, "
+                                     "our_shots, their_shots) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"HISTORY: Could not save {len(rows)} games: {e}")
+            if closing:
+                conn.close()
+                return
+
+    def record(self, peer, won, grid_size, our_shots, their_shots, started_at, finished_at=None):
+        """Queue a finished game. Returns at once; the insert happens on the writer thread."""
+        finished_at = time.time() if finished_at is None else finished_at
+        self.queue.put((started_at, finished_at, peer, "WIN" if won else "LOSS", grid_size, our_shots, their_shots))
+
+    def close(self):
+        """Commit everything queued so far and stop the writer"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.reader: self.reader.close()
+
+    # --- Queries (read-only, on the caller's thread) ---
+
+    def _query(self, sql, args=()):
+        if self.reader is None:
+            self.reader = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self.reader.execute(sql, args).fetchall()
+
+    def win_rate(self, peer=None, since=None):
+        """(wins, games), optionally against one peer and / or since a timestamp"""
+        where, args = [], []
+        if peer is not None: where.append("peer = ?"); args.append(peer)
+        if since is not None: where.append("finished_at >= ?"); args.append(since)
+        sql = "SELECT COALESCE(SUM(outcome = 'WIN'), 0), COUNT(*) FROM games"
+        if where: sql += " WHERE " + " AND ".join(where)
+        return tuple(self._query(sql, args)[0])
+
+    def streak(self, peer=None):
+        """(outcome, length) of the current run of identical results, or (None, 0)"""
+        sql = "SELECT outcome FROM games"
+        args = ()
+        if peer is not None: sql, args = sql + " WHERE peer = ?", (peer,)
+        # The run can only be as long as the games since the last opposite result
+        rows = self._query(sql + " ORDER BY finished_at DESC LIMIT 1", args)
+        if not rows: return None, 0
+        outcome = rows[0][0]
+        other = "LOSS" if outcome == "WIN" else "WIN"
+        last_other = self._query("SELECT MAX(finished_at) FROM games WHERE outcome = ?"
+                                 + (" AND peer = ?" if peer is not None else ""),
+                                 (other,) + tuple(args))[0][0]
+        count = self._query("SELECT COUNT(*) FROM games WHERE outcome = ? AND finished_at > ?"
+                            + (" AND peer = ?" if peer is not None else ""),
+                            (outcome, last_other if last_other is not None else float("-inf")) + tuple(args))[0][0]
+        return outcome, count
+
+    def head_to_head(self, peer):
+        """{"wins", "losses", "avg_shots"} against one peer"""
+        wins, losses, shots = self._query(
+            "SELECT COALESCE(SUM(outcome = 'WIN'), 0), COALESCE(SUM(outcome = 'LOSS'), 0), AVG(our_shots) "
+            "FROM games WHERE peer = ?", (peer,))[0]
+        return {"wins": wins, "losses": losses, "avg_shots": shots}
+
+    def opponents(self, limit=10):
+        """(peer, games, wins) for the most-played peers"""
+        return self._query("SELECT peer, COUNT(*) AS n, SUM(outcome = 'WIN') FROM games "
+                           "GROUP BY peer ORDER BY n DESC LIMIT ?", (limit,))
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else HISTORY_DB
+    history = GameHistory(path)
+    start = time.perf_counter()
+    wins, games = history.win_rate()
+    outcome, run = history.streak()
+    print(f"{games} games, {wins} won ({wins / max(games, 1):.1%}), current streak {run} x {outcome}")
+    if len(sys.argv) > 2:
+        h2h = history.head_to_head(sys.argv[2])
+        print(f"vs {sys.argv[2]}: {h2h['wins']}-{h2h['losses']}, avg {h2h['avg_shots'] or 0:.1f} shots")
+    else:
+        for peer, n, w in history.opponents():
+            print(f"  {peer}: {w}/{n}")
+    print(f"queries took {(time.perf_counter() - start) * 1000:.1f} ms")
+    history.close()
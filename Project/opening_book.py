@@ -0,0 +1,176 @@
+# opening_book.py
+# Precomputed opening book: the shot to fire for every run of observed results
+# over the first BOOK_DEPTH shots, for the fixed grid / fleet presets. Each
+# book move is fixed by the results before it, so a position is just the path
+# of MISS / HIT / SUNK results from the start. Positions are numbered like a
+# ternary heap (root 0, children 3i+1..3i+3), and the book is one uint16 cell
+# per position, saved under cache/book/ and memory-mapped on first use.
+# BOOK_PRESETS are the game's presets (presets.py) minus the large-board ones,
+# which don't get a book. A book missing from the cache takes seconds to build,
+# so get_book builds it on a background thread; with wait=False the game plays
+# without a book until it is done.
+#
+# Each move is the cell most likely to hit over every layout still possible.
+# Positions with few enough layouts for the live endgame solver
+# (endgame.MAX_LAYOUTS) are left out of the book, since the solver's exact
+# answer is already fast there. Boards too big to enumerate (past 7x7) use
+# DensityPlayer's choice instead.
+#
+#   python3 opening_book.py [grid_size] [fleet, e.g. 3,2] [depth]   # build (all book presets by default)
+
+import os
+import sys
+import time
+import random
+import threading
+
+import numpy as np
+
+from placements import cache_key
+from endgame import EndgameSolver, shot_outcome, MAX_LAYOUTS
+from presets import PRESETS
+from sampler import SPARSE_MIN_CELLS
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+BOOK_PRESETS = [(grid, fleet) for _, grid, fleet in PRESETS if grid * grid <= SPARSE_MIN_CELLS]
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "book")
+
+BOOK_DEPTH = 8  # shots covered by the book
+BOOK_VERSION = 2  # bump whenever build_moves picks moves differently, so old caches get rebuilt
+NO_MOVE = 0xFFFF
+OUTCOMES = {"MISS": 0, "HIT": 1, "SUNK": 2}  # ALL_SUNK ends the game, so never needs a move
+
+_books = {}
+_loading = {}   # key -> Event set once the book is in _books (or failed to build)
+_books_lock = threading.Lock()
+
+def get_book(grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, depth=BOOK_DEPTH, cache_dir=CACHE_DIR, wait=True):
+    """Opening book for a preset grid / fleet, from memory, disk or built
+    fresh. None for anything that isn't in BOOK_PRESETS. With wait=False it is
+    also None while the book is still loading; ask again later."""
+    if (grid_size, sorted(fleet)) not in [(g, sorted(f)) for g, f in BOOK_PRESETS]: return None
+    key = f"{cache_key(grid_size, fleet)}_d{depth}_v{BOOK_VERSION}"
+    with _books_lock:
+        ready = _loading.get(key)
+        if ready is None:
+            ready = _loading[key] = threading.Event()
+            path = os.path.join(cache_dir, key + ".npy")
+            threading.Thread(target=_load, args=(key, ready, grid_size, fleet, depth, path), daemon=True).start()
+    if wait: ready.wait()
+    return _books.get(key)
+
+def _load(key, ready, grid_size, fleet, depth, path):
+    try:
+        _books[key] = OpeningBook.load_or_build(grid_size, fleet, depth, path)
+    except Exception as e:
+        print(f"BOOK: Could not build {key}: {e}")
+    finally:
+        ready.set()
+
+def positions(depth):
+    return (3 ** (depth + 1) - 1) // 2
+
+def build_moves(grid_size, fleet, depth):
+    moves = np.full(positions(depth), NO_MOVE, dtype=np.uint16)
+    solver = EndgameSolver(grid_size, fleet)
+    if solver.layout_perms is not None:
+        _expand_exact(solver, moves, depth, 0, range(len(solver.layouts)), 0)
+    else:
+        _expand_density(grid_size, fleet, moves, depth, 0, [])
+    return moves
+
+def _expand_exact(solver, moves, depth, node, layouts, hits):
+    if depth == 0 or len(layouts) <= MAX_LAYOUTS: return
+    n = solver.grid_size
+    counts = [0] * (n * n)
+    for i in layouts:
+        union = solver.layouts[i][1] & ~hits
+        while union:
+            low = union & -union
+            counts[low.bit_length() - 1] += 1
+            union ^= low
+    cell = max(range(len(counts)), key=lambda c: (counts[c], -c))
+    moves[node] = cell
+    b = 1 << cell
+    groups = {}
+    for i in layouts:
+        ships, union = solver.layouts[i]
+        groups.setdefault(shot_outcome(ships, union, hits, b), []).append(i)
+    for result, child in groups.items():
+        if result not in OUTCOMES: continue
+        _expand_exact(solver, moves, depth - 1, 3 * node + 1 + OUTCOMES[result], child,
+                      hits | b if result != "MISS" else hits)
+
+def _expand_density(grid_size, fleet, moves, depth, node, history):
+    from ai import DensityPlayer  # ai imports endgame, so only pull it in when needed
+    if len(history) >= depth: return
+    player = DensityPlayer()
+    player.new_game(grid_size, grid_size, fleet, random.Random(0))
+    for coord, result in history: player.shot_result(coord, result)
+    x, y = player.choose_shot()
+    moves[node] = y * grid_size + x
+    for result, o in OUTCOMES.items():
+        if result == "SUNK" and sum(r != "MISS" for _, r in history) + 1 < min(fleet): continue
+        _expand_density(grid_size, fleet, moves, depth, 3 * node + 1 + o, history + [((x, y), result)])
+
+class OpeningBook:
+    def __init__(self, grid_size, moves):
+        self.grid_size = grid_size
+        self.moves = moves
+
+    @classmethod
+    def load_or_build(cls, grid_size, fleet, depth, path):
+        try:
+            moves = np.load(path, mmap_mode="r")
+            if moves.shape != (positions(depth),) or moves.dtype != np.uint16:
+                raise ValueError(f"{moves.dtype} {moves.shape} isn't a depth {depth} book")
+            if (moves[moves != NO_MOVE] >= grid_size * grid_size).any():
+                raise ValueError(f"moves off a {grid_size}x{grid_size} grid")
+        except (OSError, ValueError):
+            moves = build_moves(grid_size, fleet, depth)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path[:-4] + ".tmp.npy"
+                np.save(tmp, moves)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"BOOK: Could not write cache {path}: {e}")
+        return cls(grid_size, moves)
+
+    def shot(self, node):
+        """Book move at a position, or None once past the book"""
+        if node is None or node >= len(self.moves): return None
+        cell = int(self.moves[node])
+        if cell == NO_MOVE: return None
+        return (cell % self.grid_size, cell // self.grid_size)
+
+    def child(self, node, coord, result):
+        """Position after firing coord and seeing result, or None if coord
+        wasn't the book move there (or the game is over)"""
+        if result not in OUTCOMES or self.shot(node) != tuple(coord): return None
+        return 3 * node + 1 + OUTCOMES[result]
+
+    def move(self, history):
+        """Book move after a list of (coord, result), or None if out of book"""
+        node = 0
+        for coord, result in history:
+            node = self.child(node, coord, result)
+            if node is None: return None
+        return self.shot(node)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        grid = int(sys.argv[1])
+        fleet = [int(v) for v in sys.argv[2].split(",")] if len(sys.argv) > 2 else SHIPS_TO_PLACE
+        presets = [(grid, fleet)]
+        if (grid, sorted(fleet)) not in [(g, sorted(f)) for g, f in BOOK_PRESETS]: BOOK_PRESETS.append((grid, fleet))
+    else:
+        presets = BOOK_PRESETS
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else BOOK_DEPTH
+    for grid, fleet in presets:
+        start = time.perf_counter()
+        book = get_book(grid, fleet, depth)
+        filled = int((np.asarray(book.moves) != NO_MOVE).sum())
+        print(f"{grid}x{grid} {fleet}: {filled} positions to depth {depth} in {time.perf_counter() - start:.2f}s, "
+              f"{book.moves.nbytes} bytes, opening shot {book.shot(0)}")
@@ -0,0 +1,145 @@
+# peer.py
+# In-process computer opponent for single-device play. AIPeer stands where the
+# RFCOMM link would be: it reads the game's outgoing JSON lines from tx_queue
+# and answers on rx_queue with exactly what a remote battleship_nfc.py sends
+# (HELLO, SHIPS_PLACED, READY_TO_START, SHOT / SHOT_BATCH, SHOT_RESULT /
+# SALVO_RESULT, ERROR). Placement and shot choice run on the peer's own thread, so
+# the render loop only ever sees finished messages turning up in rx_queue.
+# Unless a player is given, large-board mode games get a HuntPlayer, since
+# EndgamePlayer needs the dense placement index. Other games get an
+# EndgamePlayer that never waits on the solver: it is built in the background
+# from prepare(), and the player falls back to its heuristic until then.
+
+import json
+import random
+import threading
+
+from board import Board, encode_results, decode_results
+from ai import HuntPlayer, EndgamePlayer
+from endgame import get_solver
+from sampler import SPARSE_MIN_CELLS
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+class AIPeer:
+    def __init__(self, tx_queue, rx_queue, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE,
+                 salvo_size=1, player=None, rng=None):
+        self.tx_queue = tx_queue
+        self.rx_queue = rx_queue
+        self.grid_size = grid_size
+        self.fleet = list(fleet)
+        self.salvo_size = salvo_size
+        self.chosen = player    # None: picked per game from the board size
+        self.player = None
+        self.rng = rng or random.Random()
+        self.first = False      # set before READY_TO_START: the peer fires the opening shot
+        self.board = None
+        self.shots_fired = 0
+        self.salvo = []         # last SHOT_BATCH sent, in order, to match up with SALVO_RESULT
+        self.in_game = False
+        self.sequence = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.prepare(self.grid_size, self.fleet)
+        return self
+
+    def prepare(self, grid_size, fleet):
+        """Start building what a game on this preset will need, before its HELLO"""
+        if self.chosen is None and grid_size * grid_size <= SPARSE_MIN_CELLS:
+            get_solver(grid_size, fleet, wait=False)
+
+    def run(self):
+        while True:
+            line = self.tx_queue.get()
+            try:
+                self.handle(json.loads(line))
+            except Exception as e:
+                print(f"AI PEER: {e}")
+            self.tx_queue.task_done()
+
+    def send(self, data):
+        data["seq"] = self.sequence
+        self.sequence += 1
+        self.rx_queue.put(json.dumps(data))
+
+    def handle(self, data):
+        kind = data.get("type")
+        if kind == "HELLO":
+            if "grid" in data:  # the player's preset (and salvo size) always wins
+                self.grid_size, self.fleet = data["grid"], list(data["fleet"])
+                self.salvo_size = data.get("salvo", 1)
+            self.new_game()
+            self.send({"type": "HELLO"})
+            self.send({"type": "SHIPS_PLACED"})
+        elif not self.in_game:
+            return
+        elif kind == "DISCONNECT":
+            self.in_game = False
+        elif kind == "READY_TO_START":
+            self.send({"type": "READY_TO_START"})
+            if self.first: self.fire()
+        elif kind == "SHOT":
+            if not self.board.on_board(data.get("coord")):
+                self.send({"type": "ERROR", "reason": f"bad SHOT: {data.get('coord')!r:.60}"})
+                return
+            coord = tuple(data["coord"])
+            if self.board.is_shot(coord):
+                self.send({"type": "SHOT_RESULT", "coord": coord, "result": "REPEAT"})
+                return
+            result = self.board.receive_shot(coord)
+            self.player.opponent_shot(coord, result)
+            self.send({"type": "SHOT_RESULT", "coord": coord, "result": result})
+            self.after_defending([result])
+        elif kind == "SHOT_BATCH":
+            coords = data.get("coords")
+            if not isinstance(coords, list) or not 0 < len(coords) <= self.salvo_size \
+                    or not all(map(self.board.on_board, coords)):
+                self.send({"type": "ERROR", "reason": f"bad SHOT_BATCH for salvo size {self.salvo_size}: {coords!r:.60}"})
+                return
+            coords = [tuple(c) for c in coords]
+            results = self.board.receive_salvo(coords)
+            for coord, result in zip(coords, results):
+                if result != "REPEAT": self.player.opponent_shot(coord, result)
+            self.send({"type": "SALVO_RESULT", "coords": coords, "results": encode_results(results)})
+            if any(r != "REPEAT" for r in results): self.after_defending(results)
+        elif kind == "SHOT_RESULT":
+            if data["result"] == "REPEAT": return  # our players never repeat a cell
+            self.player.shot_result(tuple(data["coord"]), data["result"])
+            if data["result"] == "ALL_SUNK": self.in_game = False
+        elif kind == "SALVO_RESULT":
+            if [tuple(c) for c in data.get("coords", self.salvo)] != [tuple(c) for c in self.salvo]: return
+            results = decode_results(data["results"])
+            for coord, result in zip(self.salvo, results):
+                if result != "REPEAT": self.player.shot_result(coord, result)
+            if "ALL_SUNK" in results: self.in_game = False
+        elif kind == "ERROR":
+            print(f"AI PEER: shot rejected: {data.get('reason')}")
+
+    def new_game(self):
+        self.board = Board(self.grid_size)
+        self.player = self.chosen or (HuntPlayer() if self.grid_size ** 2 > SPARSE_MIN_CELLS else EndgamePlayer(False))
+        self.player.new_game(self.grid_size, self.grid_size, self.fleet, self.rng)
+        self.player.place_ships(self.board)
+        self.shots_fired = 0
+        self.salvo = []
+        self.in_game = True
+
+    def after_defending(self, results):
+        if "ALL_SUNK" in results:
+            self.in_game = False
+        else:
+            self.fire()
+
+    def fire(self):
+        left = self.grid_size * self.grid_size - self.shots_fired
+        if self.salvo_size > 1:
+            self.salvo = self.player.choose_salvo(min(self.salvo_size, left))
+            self.shots_fired += len(self.salvo)
+            self.send({"type": "SHOT_BATCH", "coords": self.salvo})
+        elif left:
+            self.shots_fired += 1
+            self.send({"type": "SHOT", "coord": tuple(self.player.choose_shot())})
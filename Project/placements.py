@@ -0,0 +1,133 @@
+# placements.py
+# Precomputed index of every legal (start, orientation) for each ship length in
+# a fleet on a square grid. The tables are built once per (GRID_SIZE, fleet),
+# saved as .npy files under cache/placements/ and memory-mapped on later loads.
+# A cached table whose shape doesn't match the grid and fleet (a stale or
+# half-written cache) is rebuilt.
+#
+# Row layout: for each distinct length (ascending), horizontal placements in
+# row-major start order, then vertical ones. ai.DensityPlayer relies on this
+# order to find the placements covering a cell arithmetically.
+
+import os
+
+import numpy as np
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "placements")
+
+MASK_TABLE_MAX_CELLS = 4096  # bigger grids rebuild bitmasks from the cell table on demand
+
+HORIZONTAL, VERTICAL = 0, 1
+ORIENTATION_CODES = {"horizontal": HORIZONTAL, "vertical": VERTICAL}
+
+_loaded = {}
+
+def cache_key(grid_size, fleet):
+    return f"g{grid_size}_f{'-'.join(str(l) for l in sorted(fleet))}"
+
+def get_index(grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE, cache_dir=CACHE_DIR):
+    """Placement index for this grid/fleet, from memory, disk or built fresh"""
+    key = cache_key(grid_size, fleet)
+    if key not in _loaded:
+        _loaded[key] = PlacementIndex.load_or_build(grid_size, fleet, os.path.join(cache_dir, key))
+    return _loaded[key]
+
+def build_tables(grid_size, lengths):
+    cells = grid_size * grid_size
+    max_len = max(lengths)
+    rows, cell_rows = [], []
+    lookup = np.full((len(lengths), 2, grid_size, grid_size), -1, dtype=np.int32)
+    for li, length in enumerate(lengths):
+        k = np.arange(length)
+        for o, step, xs, ys in ((HORIZONTAL, 1, grid_size - length + 1, grid_size),
+                                (VERTICAL, grid_size, grid_size, grid_size - length + 1)):
+            for y in range(max(ys, 0)):
+                for x in range(max(xs, 0)):
+                    lookup[li, o, y, x] = len(rows)
+                    rows.append((x, y, o, length))
+                    padded = np.full(max_len, -1, dtype=np.int32)
+                    padded[:length] = y * grid_size + x + k * step
+                    cell_rows.append(padded)
+    rows = np.array(rows, dtype=np.int32).reshape(-1, 4)
+    cell_table = np.array(cell_rows, dtype=np.int32).reshape(-1, max_len)
+    nbytes = (cells + 7) // 8 if cells <= MASK_TABLE_MAX_CELLS else 0
+    masks = np.zeros((len(rows), nbytes), dtype=np.uint8)
+    if nbytes:
+        r, k = np.nonzero(cell_table >= 0)
+        c = cell_table[r, k]
+        np.bitwise_or.at(masks, (r, c >> 3), (1 << (c & 7)).astype(np.uint8))
+    return {"rows": rows, "cells": cell_table, "masks": masks, "lookup": lookup}
+
+def table_shapes(grid_size, lengths):
+    """Shape build_tables gives each table for this grid and lengths"""
+    placements = sum(2 * grid_size * max(grid_size - length + 1, 0) for length in lengths)
+    cells = grid_size * grid_size
+    nbytes = (cells + 7) // 8 if cells <= MASK_TABLE_MAX_CELLS else 0
+    return {"rows": (placements, 4), "cells": (placements, max(lengths)), "masks": (placements, nbytes),
+            "lookup": (len(lengths), 2, grid_size, grid_size)}
+
+class PlacementIndex:
+    def __init__(self, grid_size, lengths, tables):
+        self.grid_size = grid_size
+        self.lengths = list(lengths)
+        self.rows = tables["rows"]          # (P, 4): x, y, orientation code, length
+        self.cells = tables["cells"]        # (P, max_len) cell indices, -1 padded
+        self.masks = tables["masks"]        # (P, ceil(cells / 8)) little-endian bitmask bytes, or (P, 0)
+        self.lookup = tables["lookup"]      # (len(lengths), 2, y, x) -> row or -1
+        self._int_masks = {}
+        by_length = np.asarray(self.rows[:, 3])
+        self._spans = {l: (int(np.searchsorted(by_length, l, "left")), int(np.searchsorted(by_length, l, "right")))
+                       for l in self.lengths}
+
+    @classmethod
+    def load_or_build(cls, grid_size, fleet, path):
+        lengths = sorted(set(fleet))
+        names = ("rows", "cells", "masks", "lookup")
+        try:
+            tables = {n: np.load(os.path.join(path, n + ".npy"), mmap_mode="r") for n in names}
+            shapes = table_shapes(grid_size, lengths)
+            stale = [n for n in names if tables[n].shape != shapes[n]]
+            if stale: raise ValueError(f"{', '.join(stale)} don't match a {grid_size}x{grid_size} grid")
+        except (OSError, ValueError):
+            tables = build_tables(grid_size, lengths)
+            try:
+                os.makedirs(path, exist_ok=True)
+                for n in names:
+                    tmp = os.path.join(path, n + ".tmp.npy")
+                    np.save(tmp, tables[n])
+                    os.replace(tmp, os.path.join(path, n + ".npy"))
+            except OSError as e:
+                print(f"PLACEMENTS: Could not write cache {path}: {e}")
+        return cls(grid_size, lengths, tables)
+
+    def span(self, length):
+        """(first, end) row range holding every placement of this length"""
+        return self._spans[length]
+
+    def cells_of(self, length):
+        first, end = self._spans[length]
+        return np.asarray(self.cells[first:end, :length])
+
+    def mask(self, row):
+        m = self._int_masks.get(row)
+        if m is None:
+            if self.masks.shape[1]:
+                m = int.from_bytes(self.masks[row].tobytes(), "little")
+            else:
+                m = 0
+                for c in self.cells[row, :self.rows[row, 3]]: m |= 1 << int(c)
+            self._int_masks[row] = m
+        return m
+
+    def find(self, start, length, orientation):
+        """Row of this placement, or -1 if it doesn't fit on the grid"""
+        x, y = start
+        if length not in self._spans or not (0 <= x < self.grid_size and 0 <= y < self.grid_size): return -1
+        return int(self.lookup[self.lengths.index(length), ORIENTATION_CODES[orientation], y, x])
+
+    def placement(self, row):
+        """(start, length, orientation) for a row, as Board.place_ship takes it"""
+        x, y, o, length = (int(v) for v in self.rows[row])
+        return (x, y), length, "horizontal" if o == HORIZONTAL else "vertical"
@@ -0,0 +1,16 @@
+# presets.py
+# Board / fleet presets the game offers, shared by battleship_nfc.py (which
+# cycles through them on the start screen) and opening_book.py (which builds a
+# book for each one small enough to have one). Each preset is
+# (name, grid size, ship lengths).
+#
+# Large-board mode: a grid past sampler.SPARSE_MIN_CELLS cells (up to 1000,
+# with a fleet to match, and auto-place) only ever draws a window around the
+# cursor, and skips the shot advisor and opening book, which both need the
+# dense placement index.
+
+PRESETS = [
+    ("Quick 5x5", 5, [3, 2]),
+    ("Classic 10x10", 10, [5, 4, 3, 3, 2]),
+    ("Large 100x100", 100, [5, 4, 3, 3, 2] * 4),
+]
@@ -0,0 +1,41 @@
+# preview.py
+# Placement preview for the ship under the cursor. The legal-start table for
+# each (length, orientation) is one bitmask built from the board's occupancy,
+# and is only rebuilt after a ship is placed. Validity and the covered cells
+# are only worked out again when the cursor, orientation, ship or board
+# changes, so an idle placement screen costs one tuple compare per frame.
+#
+# Caches hold the board itself and its version, not id(board): a fresh board
+# can be given the id of one just thrown away, and must not get its tables.
+
+from board import HORIZONTAL
+
+class PlacementPreview:
+    def __init__(self):
+        self.key = None
+        self.board = None       # board and board.version the tables were built for
+        self.version = None
+        self.tables = {}        # (length, orientation) -> legal start bitmask
+        self.valid = False
+        self.cells = []
+
+    def legal_starts(self, board, length, orientation):
+        if board is not self.board or board.version != self.version:
+            self.board, self.version = board, board.version
+            self.tables = {}
+        table = self.tables.get((length, orientation))
+        if table is None:
+            table = self.tables[(length, orientation)] = board.legal_starts(length, orientation)
+        return table
+
+    def update(self, board, cursor, length, orientation):
+        """Refresh for this frame. Returns True if valid / cells changed."""
+        key = (board.version, cursor, length, orientation)
+        if board is self.board and key == self.key: return False
+        self.key = key
+        x, y = cursor
+        legal = self.legal_starts(board, length, orientation)
+        self.valid = board.in_bounds(cursor) and bool(legal >> (y * board.width + x) & 1)
+        if orientation == HORIZONTAL: self.cells = [(x + i, y) for i in range(length)]
+        else: self.cells = [(x, y + i) for i in range(length)]
+        return True
@@ -0,0 +1,206 @@
+# replay.py
+# Append-only binary match log. A file is an 8-byte header followed by
+# fixed-size 16-byte records, so a reader can memory-map it and index or
+# iterate records directly, with no parsing. A record torn by a power cut is
+# simply ignored on read.
+#
+# Record fields: time (float64, time.time()), kind, value, x, y, extra
+#   GAME_START  value=0               x, y = board width, height
+#   PLACE       value=ship length     x, y = start, extra = orientation (0 horizontal, 1 vertical)
+#   SHOT        value=side            x, y = target
+#   RESULT      value=side            x, y = target, extra = result code
+#   GAME_END    value=winner side
+#   RESUME      value=0               x, y = board width, height; the game before it
+#                                     carries on from a snapshot, nothing is re-logged
+# side is OURS for shots this device fired and THEIRS for shots it received.
+#
+# If a write fails (disk full, card pulled) the writer keeps draining its queue
+# without writing, and the exception stays in ReplayWriter.error for the game
+# to report.
+#
+#   python3 replay.py file.bsr                 # summarise a log
+#   python3 replay.py write file.bsr [games]   # log engine games, random vs random
+
+import os
+import sys
+import mmap
+import time
+import queue
+import struct
+import threading
+
+import numpy as np
+
+MAGIC = b"BSRP"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<dBBHHH")
+RECORD_DTYPE = np.dtype([("time", "<f8"), ("kind", "u1"), ("value", "u1"),
+                         ("x", "<u2"), ("y", "<u2"), ("extra", "<u2")])
+
+GAME_START, PLACE, SHOT, RESULT, GAME_END, RESUME = range(6)
+KIND_NAMES = ["GAME_START", "PLACE", "SHOT", "RESULT", "GAME_END", "RESUME"]
+OURS, THEIRS = 0, 1
+RESULT_IDS = {"MISS": 0, "HIT": 1, "SUNK": 2, "ALL_SUNK": 3}
+RESULT_NAMES = ["MISS", "HIT", "SUNK", "ALL_SUNK"]
+ORIENTATION_IDS = {"horizontal": 0, "vertical": 1}
+ORIENTATION_NAMES = ["horizontal", "vertical"]
+
+class ReplayWriter:
+    """Queues records and appends them from a background thread, one write()
+    per batch of whatever has queued up. Safe to call from the game loop."""
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            check_header(path)
+            # drop a record torn by a power cut so new ones stay aligned
+            size = os.path.getsize(path)
+            os.truncate(path, size - (size - HEADER.size) % RECORD.size)
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.error = None  # the exception that stopped logging, if any
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while True: batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            closing = batch[-1] is None
+            records = [r for r in batch if r is not None]
+            if self.error is None:
+                try:
+                    self.file.write(b"".join(RECORD.pack(*r) for r in records))
+                    self.file.flush()
+                    if closing or any(r[1] == GAME_END for r in records):
+                        os.fsync(self.file.fileno())
+                except Exception as e:
+                    self.error = e
+                    print(f"REPLAY: Could not write {self.path}, logging stopped: {e}")
+            if closing:
+                try: self.file.close()
+                except OSError: pass
+                return
+
+    def record(self, kind, value=0, x=0, y=0, extra=0, at=None):
+        self.queue.put((time.time() if at is None else at, kind, value, x, y, extra))
+
+    def game_start(self, width, height):
+        self.record(GAME_START, 0, width, height)
+
+    def resume(self, width, height):
+        self.record(RESUME, 0, width, height)
+
+    def place(self, start, length, orientation):
+        self.record(PLACE, length, start[0], start[1], ORIENTATION_IDS[orientation])
+
+    def shot(self, side, coord):
+        self.record(SHOT, side, coord[0], coord[1])
+
+    def result(self, side, coord, result):
+        self.record(RESULT, side, coord[0], coord[1], RESULT_IDS[result])
+
+    def game_end(self, winner):
+        self.record(GAME_END, winner)
+
+    def close(self):
+        """Write out everything queued so far and close the file"""
+        self.queue.put(None)
+        self.thread.join()
+
+def check_header(path):
+    with open(path, "rb") as f:
+        magic, version, size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or size != RECORD.size:
+        raise ValueError(f"{path} is not a replay log")
+    if version != VERSION:
+        raise ValueError(f"{path} is replay version {version}, expected {VERSION}")
+
+class ReplayReader:
+    """Memory-mapped view of a replay log. Iterating yields raw record tuples
+    (time, kind, value, x, y, extra); array() gives the same as a NumPy
+    structured array without copying."""
+
+    def __init__(self, path):
+        check_header(path)
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = (size - HEADER.size) // RECORD.size  # a torn last record is left out
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if not self.count: return iter(())
+        end = HEADER.size + self.count * RECORD.size
+        return RECORD.iter_unpack(memoryview(self.map)[HEADER.size:end])
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count: raise IndexError(i)
+        return RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size)
+
+    def array(self):
+        """Zero-copy view of the records. Drop it before calling close()."""
+        if not self.count: return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.count, offset=HEADER.size)
+
+    def games(self):
+        """Lists of records, one per game, split at GAME_START"""
+        game = None
+        for record in self:
+            if record[1] == GAME_START:
+                if game: yield game
+                game = []
+            if game is not None: game.append(record)
+        if game: yield game
+
+    def close(self):
+        if self.map: self.map.close()
+        self.file.close()
+
+def write_match(writer, match, history, side=0):
+    """Log an engine.play_match game (with its history list) as seen by player side"""
+    board = match["boards"][side]
+    writer.game_start(board.width, board.height)
+    for start, length, orientation in board.ships:
+        writer.place(start, length, orientation)
+    for shooter, coord, result in history:
+        who = OURS if shooter == side else THEIRS
+        writer.shot(who, coord)
+        writer.result(who, coord, result)
+    writer.game_end(OURS if match["winner"] == side else THEIRS)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "write":
+        import random
+        from engine import RandomPlayer, play_match
+        games = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+        writer = ReplayWriter(sys.argv[2])
+        rng = random.Random(0)
+        players = [RandomPlayer(), RandomPlayer()]
+        start = time.perf_counter()
+        for g in range(games):
+            history = []
+            write_match(writer, play_match(players, rng=rng, first=g % 2, history=history), history)
+        writer.close()
+        if writer.error: raise SystemExit(f"log incomplete: {writer.error}")
+        print(f"logged {games} games in {time.perf_counter() - start:.2f}s")
+    else:
+        reader = ReplayReader(sys.argv[1])
+        start = time.perf_counter()
+        records = reader.array()
+        kinds = np.bincount(records["kind"], minlength=len(KIND_NAMES))
+        elapsed = time.perf_counter() - start
+        print(f"{len(reader)} records ({os.path.getsize(sys.argv[1]) / 1e6:.1f} MB) scanned in {elapsed * 1000:.1f} ms")
+        for name, n in zip(KIND_NAMES, kinds): print(f"  {name:<10} {n}")
+        del records  # the array borrows the mmap, which can't close under it
+        reader.close()
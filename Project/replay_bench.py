@@ -0,0 +1,273 @@
+# replay_bench.py
+# End-to-end performance regression suite. Matches from a replay log (see
+# replay.py) are played back through battleship_nfc.py's own state machine
+# (next_state / perform_state) and renderer (update_screen) under SDL's dummy
+# video driver. Our side is driven by scripted button presses with human-like
+# gaps between them. The opponent is a ReplayPeer answering on rx_queue from the
+# recording. The game runs on a virtual clock, so message timeouts and button
+# debounce sleeps cost frames, not wall time.
+#
+# Each run reports frame times and Python allocations (the largest and the mean
+# per-frame tracemalloc peak) per game state plus message counts, and appends them to a JSON history file. The run fails (exit
+# status 1) when a state's mean frame time regresses past REGRESSION_THRESHOLD
+# against the median of the last BASELINE_RUNS runs.
+#
+# Run it on the Pi (GPIO, Bluetooth and pigame must import), e.g.
+#   python3 replay.py write bench.bsr 50
+#   python3 replay_bench.py bench.bsr [games] [history.json]
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+from collections import Counter
+from statistics import median
+
+os.environ["BATTLESHIP_VIDEODRIVER"] = "dummy"
+import battleship_nfc as game
+from replay import ReplayReader, GAME_START, PLACE, RESULT, GAME_END, OURS, THEIRS, \
+    RESULT_NAMES, ORIENTATION_NAMES
+
+FRAME_TIME = 1 / 60          # virtual seconds per frame, as CLOCK.tick(60)
+INPUT_GAP = 0.25             # virtual seconds between scripted button presses
+END_FRAMES = 60              # frames of the END screen per game
+MAX_FRAMES = 100000          # per game, in case a replay doesn't fit the state machine
+HISTORY = "bench_history.json"
+BASELINE_RUNS = 5
+REGRESSION_THRESHOLD = 0.20  # fail when mean frame time is this much over baseline
+
+class VirtualClock:
+    """Stands in for the time module inside battleship_nfc"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+class InputScript:
+    """Fake GPIO.input: presses one scripted button at a time, only while the
+    state it was scripted for is polling for input"""
+
+    def __init__(self, clock, actions):
+        self.clock = clock
+        self.actions = list(actions)  # (state, pin)
+        self.ready_at = clock.time() + INPUT_GAP
+        self.presses = 0
+
+    def ready_for(self, state):
+        if state == "PLACING_SHIPS": return not game.done_placing_ships
+        if state == "SHOOTING": return not game.shot_fired
+        return False
+
+    def __call__(self, pin):
+        if not self.actions or self.clock.time() < self.ready_at: return 1
+        state, wanted = self.actions[0]
+        if game.game_state != state or not self.ready_for(state) or pin != wanted: return 1
+        self.actions.pop(0)
+        self.ready_at = self.clock.time() + INPUT_GAP
+        self.presses += 1
+        return 0
+
+def cursor_moves(cursor, target, state):
+    """Presses that walk the wrapping cursor from cursor to target"""
+    dx = (target[0] - cursor[0]) % game.GRID_SIZE
+    dy = (target[1] - cursor[1]) % game.GRID_SIZE
+    return [(state, game.BUTTON_RIGHT)] * dx + [(state, game.BUTTON_DOWN)] * dy
+
+def parse_game(records):
+    """(placements in fleet order, [(side, coord, result)]) or None if this
+    recording can't be played with the current GRID_SIZE / SHIPS_TO_PLACE"""
+    width = records[0][3]
+    places = [((r[3], r[4]), r[2], ORIENTATION_NAMES[r[5]]) for r in records if r[1] == PLACE]
+    shots = [(r[2], (r[3], r[4]), RESULT_NAMES[r[5]]) for r in records if r[1] == RESULT]
+    if width != game.GRID_SIZE or records[-1][1] != GAME_END or not shots: return None
+    ordered = []
+    for length in game.SHIPS_TO_PLACE:
+        match = next((p for p in places if p[1] == length and p not in ordered), None)
+        if match is None: return None
+        ordered.append(match)
+    if len(ordered) != len(places): return None
+    return ordered, shots
+
+def script_for(placements, shots):
+    actions, cursor = [], (0, 0)
+    for start, length, orientation in placements:
+        actions += cursor_moves(cursor, start, "PLACING_SHIPS")
+        if orientation == "vertical": actions.append(("PLACING_SHIPS", game.BUTTON_ROTATE))
+        actions.append(("PLACING_SHIPS", game.BUTTON_SELECT))
+        cursor = start
+    for side, coord, _ in shots:
+        if side != OURS: continue
+        actions += cursor_moves(cursor, coord, "SHOOTING")
+        actions.append(("SHOOTING", game.BUTTON_SELECT))
+        cursor = coord
+    return actions
+
+class ReplayPeer:
+    """The recorded opponent. Pumped synchronously between frames, so message
+    timing is deterministic and its work never lands in a frame time."""
+
+    def __init__(self, shots):
+        self.shots = shots
+        self.next = 0            # index into shots of the next one to be resolved
+        self.outstanding = False
+        self.sent = Counter()
+        self.received = Counter()
+
+    def pump(self):
+        while not game.tx_queue.empty():
+            data = json.loads(game.tx_queue.get())
+            kind = data.get("type")
+            self.received[kind] += 1
+            if kind == "HELLO":
+                self.send({"type": "HELLO"})
+                self.send({"type": "SHIPS_PLACED"})
+            elif kind == "READY_TO_START":
+                self.send({"type": "READY_TO_START"})
+                self.advance()
+            elif kind == "SHOT":
+                side, coord, result = self.shots[self.next]
+                if side != OURS or tuple(data["coord"]) != coord:
+                    raise RuntimeError(f"game fired {data['coord']}, recording has {self.shots[self.next]}")
+                self.send({"type": "SHOT_RESULT", "coord": coord, "result": result})
+                self.next += 1
+                self.advance()
+            elif kind == "SHOT_RESULT":
+                self.outstanding = False
+                self.next += 1
+                self.advance()
+
+    def send(self, data):
+        self.sent[data["type"]] += 1
+        game.rx_queue.put(json.dumps(data))
+
+    def advance(self):
+        if self.outstanding or self.next >= len(self.shots): return
+        side, coord, _ = self.shots[self.next]
+        if side == THEIRS:
+            self.send({"type": "SHOT", "coord": coord})
+            self.outstanding = True
+
+def play(placements, shots, clock, frame_times, allocations=None):
+    """Run one recorded match to its END screen. Appends each frame's cost to
+    frame_times[state] (seconds) or, when tracing, allocations[state] (bytes)."""
+    game.reset_game_state()
+    script = InputScript(clock, script_for(placements, shots))
+    game.GPIO.input = script
+    peer = ReplayPeer(shots)
+    game.IS_MASTER_PI = shots[0][0] == OURS
+    game.status = game.Status.CONNECTED
+    game.game_state = "WAITING"
+    end_frames = 0
+    for _ in range(MAX_FRAMES):
+        state = game.game_state
+        if allocations is not None:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        game.next_state()
+        game.perform_state()
+        game.update_screen()
+        elapsed = time.perf_counter() - start
+        if allocations is not None:
+            allocations.setdefault(state, []).append(tracemalloc.get_traced_memory()[1] - base)
+        else:
+            frame_times.setdefault(state, []).append(elapsed)
+        game.pygame.event.pump()
+        peer.pump()
+        clock.advance(FRAME_TIME)
+        if game.game_state == "END":
+            end_frames += 1
+            if end_frames >= END_FRAMES: break
+    else:
+        raise RuntimeError(f"match did not finish in {MAX_FRAMES} frames ({script.presses} presses made)")
+    return peer, script
+
+def run(path, games=None):
+    reader = ReplayReader(path)
+    matches = [m for m in (parse_game(g) for g in reader.games() if g[0][1] == GAME_START) if m]
+    reader.close()
+    if games: matches = matches[:games]
+    if not matches:
+        raise SystemExit(f"no replays in {path} fit a {game.GRID_SIZE}x{game.GRID_SIZE} {game.SHIPS_TO_PLACE} game")
+
+    clock = VirtualClock()
+    game.time = clock
+    frame_times, sent, received, presses = {}, Counter(), Counter(), 0
+    for placements, shots in matches:
+        peer, script = play(placements, shots, clock, frame_times)
+        sent += peer.received
+        received += peer.sent
+        presses += script.presses
+
+    # Second pass under tracemalloc, so its overhead stays out of the frame times
+    allocations = {}
+    tracemalloc.start()
+    for placements, shots in matches:
+        play(placements, shots, clock, frame_times, allocations)
+    tracemalloc.stop()
+
+    states = {}
+    for state, times in frame_times.items():
+        ordered = sorted(times)
+        peaks = allocations.get(state) or [0]
+        states[state] = {
+            "frames": len(times),
+            "mean_ms": sum(times) / len(times) * 1000,
+            "p95_ms": ordered[int(len(ordered) * 0.95)] * 1000,
+            "max_ms": ordered[-1] * 1000,
+            # per-frame tracemalloc peaks: the worst frame, and the typical one
+            "alloc_peak_kb": max(peaks) / 1024,
+            "alloc_mean_kb": sum(peaks) / len(peaks) / 1024,
+        }
+    return {"time": time.time(), "replay": os.path.basename(path), "games": len(matches),
+            "presses": presses, "states": states,
+            "messages": {"sent": dict(sent), "received": dict(received)}}
+
+def regressions(result, history):
+    """States whose mean frame time is past REGRESSION_THRESHOLD over baseline"""
+    out = []
+    recent = history[-BASELINE_RUNS:]
+    for state, stats in result["states"].items():
+        past = [run["states"][state]["mean_ms"] for run in recent if state in run["states"]]
+        if not past: continue
+        baseline = median(past)
+        if stats["mean_ms"] > baseline * (1 + REGRESSION_THRESHOLD):
+            out.append((state, baseline, stats["mean_ms"]))
+    return out
+
+if __name__ == "__main__":
+    path = sys.argv[1]
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    history_path = sys.argv[3] if len(sys.argv) > 3 else HISTORY
+
+    result = run(path, games)
+    print(f"{result['games']} games, {result['presses']} button presses")
+    print(f"{'state':<20} {'frames':>7} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} {'peak KB':>9} {'mean KB':>9}")
+    for state, s in sorted(result["states"].items()):
+        print(f"{state:<20} {s['frames']:>7} {s['mean_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['max_ms']:>8.2f} {s['alloc_peak_kb']:>9.1f} {s['alloc_mean_kb']:>9.1f}")
+    print(f"messages sent {result['messages']['sent']}, received {result['messages']['received']}")
+
+    history = []
+    if os.path.exists(history_path):
+        with open(history_path) as f: history = json.load(f)
+    failed = regressions(result, history)
+    history.append(result)
+    with open(history_path, "w") as f: json.dump(history, f, indent=1)
+
+    for state, baseline, mean in failed:
+        print(f"REGRESSION: {state} {mean:.2f} ms/frame vs baseline {baseline:.2f} ms (+{mean / baseline - 1:.0%})")
+    game.pygame.quit()
+    game.GPIO.cleanup()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,301 @@
+# sampler.py
+# Uniform random fleet layouts with no rejection or retry loops. Ships are
+# taken longest first. Every disjoint placement of all but the last three is
+# listed once in a prefix table, weighted by the exact number of ways the last
+# three can still be placed around it. A layout is one weighted draw from that
+# table, then the last three ships one at a time, each weighted by the exact
+# number of completions it leaves, so every full layout is equally likely.
+#
+# Completions of the last ships are counted in closed form, by
+# inclusion-exclusion over which of them overlap. Overlapping pairs come from
+# placement overlap matrices. Three ships that pairwise overlap always share a
+# straight run of cells, so those triples are the cells minus the edges that
+# all three cover. The counts for the first tail ship are worked out for every
+# prefix when the table is built, so a draw only computes the last two.
+#
+# When the whole fleet has few enough layouts they are also enumerated once
+# into a NumPy table, so bulk sampling is a single integers() call.
+#
+# Boards past SPARSE_MIN_CELLS (large-board mode, up to 1000x1000), or whose
+# prefix table would pass PREFIX_MAX_ROWS, are not sampled exactly: each ship
+# is dropped at a random spot and redrawn on a clash, checking only the cells
+# it covers. That is close to uniform on a sparse board, not exact.
+#
+#   python3 sampler.py [grid_size] [fleet, e.g. 3,2]
+
+import sys
+import time
+import random
+
+import numpy as np
+
+from board import iter_bits
+from placements import get_index
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+TABLE_MAX_LAYOUTS = 1000000
+PREFIX_MAX_ROWS = 200000     # prefix table rows past which a board falls back to _scatter
+TAIL_SHIPS = 3               # ships placed after the prefix table draw
+BULK_CHUNK = 4096           # layouts drawn per vectorized pass
+SPARSE_MIN_CELLS = 4096      # bigger boards use _scatter and load the placement index only for bulk sampling
+SCATTER_ATTEMPTS = 10000     # redraws per ship before giving up on a crowded big board
+
+_samplers = {}
+
+class TooManyPositions(Exception):
+    pass
+
+def get_sampler(grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE):
+    key = (grid_size, tuple(fleet))
+    if key not in _samplers:
+        _samplers[key] = FleetSampler(grid_size, fleet)
+    return _samplers[key]
+
+def weighted_choice(weights, rng):
+    """Column index per row of a (rows, n) array of whole-number weights,
+    whose row totals stay below 2 ** 24 so float32 sums them exactly"""
+    cumulative = np.cumsum(weights, axis=1)
+    pick = rng.integers(cumulative[:, -1].astype(np.int64))
+    return (cumulative > pick[:, None]).argmax(axis=1)
+
+class PrefixTable:
+    """Every disjoint placement of the longest ships of a fleet but the last
+    TAIL_SHIPS, each followed by every placement of the first tail ship, with
+    a running total of the completions each pair leaves. One searchsorted()
+    into it draws both."""
+
+    def __init__(self, base, order, head, tail, rows, cumulative):
+        self.base = base              # (cells,) already occupied
+        self.order = order            # fleet positions, longest first
+        self.head = head              # lengths covered by rows
+        self.tail = tail              # lengths placed after the draw
+        self.rows = rows              # (R, len(head)) placement rows
+        self.cumulative = cumulative  # (R * placements of tail[0],) running total, row-major
+        self.width = len(cumulative) // max(len(rows), 1)
+
+    @property
+    def total(self):
+        """Number of full layouts (ships of the same length told apart)"""
+        return int(self.cumulative[-1]) if len(self.cumulative) else 0
+
+class FleetSampler:
+    def __init__(self, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE):
+        self.grid_size = grid_size
+        self.fleet = list(fleet)
+        self.sparse = grid_size * grid_size > SPARSE_MIN_CELLS
+        self._index = None
+        self.shapes = {}    # length -> (cell, edge) coverage of each placement
+        self.overlaps = {}  # (length, length) -> placement overlap matrix
+        self.prefix = None  # PrefixTable for the whole fleet, None where it is too big
+        self.table = None   # (layouts, len(fleet)) placement rows, in fleet order
+        if self.sparse: return
+        try: self.prefix = self._prefix_table(0, self.fleet)
+        except TooManyPositions: return
+        if self.prefix.total <= TABLE_MAX_LAYOUTS:
+            self.table = self._enumerate()
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = get_index(self.grid_size, self.fleet)
+        return self._index
+
+    # --- Exact counting ---
+
+    def _shape(self, length):
+        """(cells, edges) 0/1 matrices of what each placement of a length
+        covers. Edges join neighbouring cells: horizontal ones first, then
+        vertical."""
+        if length not in self.shapes:
+            n = self.grid_size
+            cells = self.index.cells_of(length)
+            rows = np.arange(len(cells))[:, None]
+            cover = np.zeros((len(cells), n * n), dtype=np.float32)
+            cover[rows, cells] = 1
+            a, b = cells[:, :-1], cells[:, 1:]
+            edge = np.where(b == a + 1, a // n * (n - 1) + a % n, n * (n - 1) + a)
+            edges = np.zeros((len(cells), 2 * n * (n - 1)), dtype=np.float32)
+            edges[rows, edge] = 1
+            self.shapes[length] = (cover, edges)
+        return self.shapes[length]
+
+    def _overlap(self, a, b):
+        if (a, b) not in self.overlaps:
+            self.overlaps[a, b] = (self._shape(a)[0] @ self._shape(b)[0].T > 0).astype(np.float32)
+        return self.overlaps[a, b]
+
+    def _free(self, occ, length):
+        """(rows, placements) 1.0 where a placement misses the occupied cells"""
+        return (occ @ self._shape(length)[0].T == 0).astype(np.float32)
+
+    def _choice_weights(self, occ, length, rest):
+        """(rows, placements of length) number of ways to place up to two more
+        ships (rest) around each placement of length, 0 where it doesn't fit.
+        Exact in float32: no count here reaches 2 ** 24 on a board that gets a
+        prefix table."""
+        fa = self._free(occ, length)
+        if not rest: return fa
+        free = [self._free(occ, l) for l in rest]
+        # how many free spots of each later ship a placement of length leaves
+        counts = [f.sum(axis=1, keepdims=True) - f @ self._overlap(l, length) for f, l in zip(free, rest)]
+        if len(rest) == 1: return fa * counts[0]
+        # Overlapping (b, c) pairs that survive the placement: all of them,
+        # minus those where either one touches it, plus those where both do.
+        # Three pairwise-overlapping ships share a straight run of cells, so
+        # those are the cells minus the edges all three cover.
+        (b, c), (fb, fc) = rest, free
+        obc = fb @ self._overlap(b, c)
+        pairs = (obc * fc).sum(axis=1, keepdims=True)
+        pairs = pairs - (fb * (fc @ self._overlap(c, b))) @ self._overlap(b, length) \
+            - (fc * obc) @ self._overlap(c, length)
+        (cb, eb), (cc, ec) = self._shape(b), self._shape(c)
+        cover, edges = self._shape(length)
+        pairs = pairs + ((fb @ cb) * (fc @ cc)) @ cover.T - ((fb @ eb) * (fc @ ec)) @ edges.T
+        return fa * (counts[0] * counts[1] - pairs)
+
+    def _prefix_table(self, occupied, lengths):
+        n = self.grid_size
+        order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+        ordered = [lengths[i] for i in order]
+        split = max(len(ordered) - TAIL_SHIPS, 0)
+        head, tail = ordered[:split], ordered[split:]
+        base = np.zeros(n * n, dtype=np.float32)
+        base[list(iter_bits(occupied))] = 1
+        occ, rows = base[None, :], np.zeros((1, 0), dtype=np.int32)
+        for length in head:
+            r, p = np.nonzero(self._free(occ, length))
+            if len(r) > PREFIX_MAX_ROWS: raise TooManyPositions
+            rows = np.column_stack([rows[r], self.index.span(length)[0] + p]).astype(np.int32)
+            occ = occ[r] + self._shape(length)[0][p]
+        if not tail:
+            return PrefixTable(base, order, head, tail, rows, np.arange(1, len(rows) + 1, dtype=np.int64))
+        weights = np.vstack([self._choice_weights(occ[i:i + BULK_CHUNK], tail[0], tail[1:])
+                             for i in range(0, len(occ), BULK_CHUNK)])
+        return PrefixTable(base, order, head, tail, rows, np.cumsum(weights.astype(np.int64)))
+
+    def _draw(self, prefix, n, rng):
+        """(n, len(prefix.order)) placement rows, in the order the lengths were given"""
+        pick = np.searchsorted(prefix.cumulative, rng.integers(prefix.total, size=n), side="right")
+        head = prefix.rows[pick // prefix.width]
+        occ = np.repeat(prefix.base[None, :], n, axis=0)
+        games = np.arange(n)[:, None]
+        for i, length in enumerate(prefix.head):
+            occ[games, np.asarray(self.index.cells)[head[:, i], :length]] = 1
+        tail = np.zeros((n, len(prefix.tail)), dtype=np.int32)
+        for i, length in enumerate(prefix.tail):
+            if i == 0:
+                p = pick % prefix.width
+            elif i == len(prefix.tail) - 1:
+                # the last ship: any free spot, all equally likely
+                free = self._free(occ, length)
+                p = ((rng.random(free.shape, dtype=np.float32) + 1) * free).argmax(axis=1)
+            else:
+                p = weighted_choice(self._choice_weights(occ, length, prefix.tail[i + 1:]), rng)
+            tail[:, i] = self.index.span(length)[0] + p
+            occ += self._shape(length)[0][p]
+        out = np.zeros((n, len(prefix.order)), dtype=np.int32)
+        out[:, prefix.order] = np.hstack([head, tail])
+        return out
+
+    def _enumerate(self):
+        options = {}
+        for length in set(self.fleet):
+            first, end = self.index.span(length)
+            options[length] = [(r, self.index.mask(r)) for r in range(first, end)]
+        rows = []
+        def dfs(i, occ, chosen):
+            if i == len(self.fleet):
+                rows.append(list(chosen))
+                return
+            for r, m in options[self.fleet[i]]:
+                if m & occ: continue
+                chosen.append(r)
+                dfs(i + 1, occ | m, chosen)
+                chosen.pop()
+        dfs(0, 0, [])
+        return np.array(rows, dtype=np.int32).reshape(-1, len(self.fleet))
+
+    # --- Single layouts ---
+
+    def complete(self, occupied=0, lengths=None, rng=random):
+        """Random placements for lengths around already-placed ships, uniform
+        except in large-board mode. Returns a list of (start, length,
+        orientation) ready for Board.place_ship, or None if the ships can't fit."""
+        lengths = self.fleet if lengths is None else list(lengths)
+        if self.sparse or self.prefix is None:
+            return self._scatter(occupied, lengths, rng)
+        if occupied == 0 and lengths == self.fleet:
+            if self.table is not None:
+                return [self.index.placement(int(r)) for r in self.table[rng.randrange(len(self.table))]]
+            prefix = self.prefix
+        else:
+            prefix = self._prefix_table(occupied, lengths)
+        if not prefix.total: return None
+        rows = self._draw(prefix, 1, np.random.default_rng(rng.getrandbits(64)))[0]
+        return [self.index.placement(int(r)) for r in rows]
+
+    def _scatter(self, occupied, lengths, rng):
+        # Longest ship first, each at a random spot still free. Close to
+        # uniform on sparse boards, not exact. A spot is only checked when it
+        # is drawn.
+        n = self.grid_size
+        taken = set(iter_bits(occupied))
+        picks = [None] * len(lengths)
+        for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+            length = lengths[i]
+            if length > n: return None
+            for _ in range(SCATTER_ATTEMPTS):
+                # a square grid has as many horizontal spots as vertical ones
+                o, a, b = rng.randrange(2), rng.randrange(n - length + 1), rng.randrange(n)
+                x, y, step = (a, b, 1) if o == 0 else (b, a, n)
+                cells = range(y * n + x, y * n + x + length * step, step)
+                if not any(c in taken for c in cells): break
+            else:
+                return None
+            taken.update(cells)
+            picks[i] = ((x, y), length, "horizontal" if o == 0 else "vertical")
+        return picks
+
+    # --- Bulk ---
+
+    def sample_rows(self, n, rng=None):
+        """(n, len(fleet)) placement rows, one full layout per row"""
+        rng = rng or np.random.default_rng()
+        if self.table is not None:
+            return self.table[rng.integers(len(self.table), size=n)]
+        if self.prefix is not None:
+            return np.vstack([self._draw(self.prefix, min(BULK_CHUNK, n - i), rng) for i in range(0, n, BULK_CHUNK)])
+        # No exact sampler for this board: scattered layouts, one at a time
+        seeded = random.Random(int(rng.integers(2 ** 63)))
+        out = np.zeros((n, len(self.fleet)), dtype=np.int32)
+        for i in range(n):
+            picks = self._scatter(0, self.fleet, seeded)
+            if picks is None: raise ValueError(f"fleet {self.fleet} doesn't fit a {self.grid_size}x{self.grid_size} board")
+            out[i] = [self.index.find(*pick) for pick in picks]
+        return out
+
+    def sample_ship_ids(self, n, rng=None):
+        """(n, cells) int8 array of ship ids (fleet order), -1 for water"""
+        rows = self.sample_rows(n, rng)
+        ship_id = np.full((n, self.grid_size * self.grid_size), -1, dtype=np.int8)
+        games = np.arange(n)[:, None]
+        for s, length in enumerate(self.fleet):
+            ship_id[games, np.asarray(self.index.cells)[rows[:, s], :length]] = s
+        return ship_id
+
+if __name__ == "__main__":
+    grid = int(sys.argv[1]) if len(sys.argv) > 1 else GRID_SIZE
+    fleet = [int(v) for v in sys.argv[2].split(",")] if len(sys.argv) > 2 else SHIPS_TO_PLACE
+    start = time.perf_counter()
+    sampler = FleetSampler(grid, fleet)
+    if sampler.table is not None: kind = f"table of {len(sampler.table)}"
+    elif sampler.prefix is not None: kind = f"{sampler.prefix.total:,} layouts, prefix table of {len(sampler.prefix.rows)}"
+    else: kind = "no exact sampler"
+    print(f"setup {time.perf_counter() - start:.3f}s, {kind}")
+    n = 1000000 if sampler.table is not None else 200000
+    start = time.perf_counter()
+    sampler.sample_ship_ids(n, np.random.default_rng(0))
+    elapsed = time.perf_counter() - start
+    print(f"{n} layouts in {elapsed:.3f}s ({n / elapsed:,.0f} layouts/s)")
@@ -0,0 +1,225 @@
+# snapshot.py
+# Crash-resume for battleship_nfc.py. At every turn boundary the game writes a
+# GameSnapshot: the grid and fleet, whose turn it is, our ships, every
+# resolved shot on both boards and the message sequence number, packed into a
+# few hundred bytes. The snapshot is written to a temporary file, fsynced and
+# renamed over the old one, and the directory is fsynced so the rename sticks,
+# so a power cut leaves either the previous turn or this one on disk, never a
+# mix. A CRC32 trailer catches anything else.
+#
+# The game hands snapshots to a SnapshotWriter, which packs them on the spot
+# and writes them from a background thread, so the fsyncs never stall a frame.
+#
+# Loading rebuilds the boards straight from the packed ships and shots, with
+# no replay of the match through the state machine.
+#
+# Both sides offer their snapshot's resume_key in HELLO and only resume when
+# the keys mirror each other: same match id (made from both sides' HELLO
+# nonces when the match started), grid and fleet, opposite turns and swapped
+# shot counts. A snapshot from a match against another device never resumes.
+#
+# Layout (little-endian):
+#   header    magic "BSSN", version
+#   state     grid size, turn, fleet size, message sequence, book node (-1 once
+#             out of book), game start time, peer address length, shots we
+#             fired, shots we received, match id
+#   fleet     one byte per ship length
+#   ships     x, y, length, orientation for each of our ships
+#   peer      UTF-8 address
+#   shots     uint32 per resolved shot, in the order they were made: the cell
+#             index, with HIT_FLAG set for a hit and SUNK_FLAG for one of ours
+#             that sank a ship. Ours first, then theirs.
+#   trailer   CRC32 of everything before it
+#
+#   python3 snapshot.py [game.snap]   # show what a snapshot holds
+
+import os
+import sys
+import time
+import queue
+import struct
+import threading
+import zlib
+
+from board import Board
+
+MAGIC = b"BSSN"
+VERSION = 2
+SNAPSHOT_PATH = "game.snap"
+HEADER = struct.Struct("<4sH")
+STATE = struct.Struct("<HBBIidBIII")
+SHIP = struct.Struct("<HHBB")
+CRC = struct.Struct("<I")
+HIT_FLAG = 1 << 31
+SUNK_FLAG = 1 << 30
+
+TURNS = ["SHOOTING", "RECEIVING"]
+ORIENTATIONS = ["horizontal", "vertical"]
+
+class GameSnapshot:
+    def __init__(self, grid_size, fleet, turn, my_board, enemy_board, message_sequence=0,
+                 book_node=None, started_at=0.0, peer=None, match_id=0):
+        self.grid_size = grid_size
+        self.fleet = list(fleet)
+        self.turn = turn                # game_state to resume in, one of TURNS
+        self.my_board = my_board
+        self.enemy_board = enemy_board
+        self.message_sequence = message_sequence
+        self.book_node = book_node
+        self.started_at = started_at
+        self.peer = peer
+        self.match_id = match_id        # shared by both sides' snapshots of one match
+
+    def resume_key(self):
+        """Sent in HELLO: [match id, grid size, fleet, turn, shots we fired, shots we received]"""
+        return [self.match_id, self.grid_size, sorted(self.fleet), self.turn,
+                len(self.enemy_board.marks), len(self.my_board.marks)]
+
+    def fits(self, key, peer=None):
+        """Whether the other side's resume_key is the mirror image of ours,
+        i.e. both stopped at the same turn of the same match, and (when both
+        are known) it comes from the device we were playing"""
+        if peer and self.peer and peer != self.peer: return False
+        other = TURNS[1 - TURNS.index(self.turn)]
+        return key == [self.match_id, self.grid_size, sorted(self.fleet), other,
+                       len(self.my_board.marks), len(self.enemy_board.marks)]
+
+    def pack(self):
+        peer = (self.peer or "").encode()
+        parts = [HEADER.pack(MAGIC, VERSION),
+                 STATE.pack(self.grid_size, TURNS.index(self.turn), len(self.fleet), self.message_sequence,
+                            -1 if self.book_node is None else self.book_node, self.started_at, len(peer),
+                            len(self.enemy_board.marks), len(self.my_board.marks), self.match_id),
+                 bytes(self.fleet)]
+        parts += [SHIP.pack(x, y, length, ORIENTATIONS.index(o)) for (x, y), length, o in self.my_board.ships]
+        parts.append(peer)
+        for board in (self.enemy_board, self.my_board):
+            shots = [c | HIT_FLAG | (SUNK_FLAG if board.sinks >> c & 1 else 0) if result == "HIT" else c
+                     for c, result in board.marks.items()]
+            parts.append(struct.pack(f"<{len(shots)}I", *shots))
+        data = b"".join(parts)
+        return data + CRC.pack(zlib.crc32(data))
+
+    @classmethod
+    def unpack(cls, data):
+        if len(data) < HEADER.size + STATE.size + CRC.size:
+            raise ValueError("snapshot is truncated")
+        body, (crc,) = data[:-CRC.size], CRC.unpack(data[-CRC.size:])
+        if zlib.crc32(body) != crc: raise ValueError("snapshot checksum mismatch")
+        magic, version = HEADER.unpack_from(body)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} game snapshot")
+        offset = HEADER.size
+        grid, turn, fleet_size, sequence, book_node, started_at, peer_size, ours, theirs, match_id = \
+            STATE.unpack_from(body, offset)
+        offset += STATE.size
+        fleet = list(body[offset:offset + fleet_size])
+        offset += fleet_size
+
+        my_board, enemy_board = Board(grid), Board(grid)
+        for _ in range(fleet_size):
+            x, y, length, o = SHIP.unpack_from(body, offset)
+            my_board.place_ship((x, y), length, ORIENTATIONS[o])
+            offset += SHIP.size
+        peer = body[offset:offset + peer_size].decode() or None
+        offset += peer_size
+
+        for c in struct.unpack_from(f"<{ours}I", body, offset):
+            cell = c & ~(HIT_FLAG | SUNK_FLAG)
+            result = "SUNK" if c & SUNK_FLAG else "HIT" if c & HIT_FLAG else "MISS"
+            enemy_board.record_result((cell % grid, cell // grid), result)
+        offset += 4 * ours
+        for c in struct.unpack_from(f"<{theirs}I", body, offset):
+            my_board.receive_shot(((c & ~HIT_FLAG) % grid, (c & ~HIT_FLAG) // grid))
+        return cls(grid, fleet, TURNS[turn], my_board, enemy_board, sequence,
+                   None if book_node < 0 else book_node, started_at, peer, match_id)
+
+    def write(self, path=SNAPSHOT_PATH):
+        write_packed(self.pack(), path)
+
+    @classmethod
+    def read(cls, path=SNAPSHOT_PATH):
+        """The snapshot at path, or None if there isn't a usable one"""
+        try:
+            with open(path, "rb") as f:
+                return cls.unpack(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error, IndexError) as e:
+            print(f"SNAPSHOT: Ignoring {path}: {e}")
+            return None
+
+def write_packed(data, path=SNAPSHOT_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    sync_dir(path)
+
+def sync_dir(path):
+    """fsync the directory holding path, so a rename or delete in it is durable"""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+def discard(path=SNAPSHOT_PATH):
+    try: os.remove(path)
+    except FileNotFoundError: return
+    sync_dir(path)
+
+class SnapshotWriter:
+    """Saves and discards snapshots from a background thread, in the order
+    they were asked for. Only the newest of a backlog of saves is written.
+    Safe to call from the game loop."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while True: batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            closing = batch[-1] is None
+            requests = [r for r in batch if r is not None]
+            try:
+                # everything before the last request is superseded by it
+                if requests and requests[-1] == "discard": discard(self.path)
+                elif requests: write_packed(requests[-1], self.path)
+            except OSError as e:
+                print(f"SNAPSHOT: Could not update {self.path}: {e}")
+            for _ in batch: self.queue.task_done()
+            if closing: return
+
+    def save(self, snapshot):
+        self.queue.put(snapshot.pack())
+
+    def discard(self):
+        self.queue.put("discard")
+
+    def read(self):
+        """The snapshot on disk once every queued save / discard has landed"""
+        self.queue.join()
+        return GameSnapshot.read(self.path)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    start = time.perf_counter()
+    snap = GameSnapshot.read(path)
+    elapsed = time.perf_counter() - start
+    if snap is None: raise SystemExit(f"no snapshot in {path}")
+    fired, received = len(snap.enemy_board.marks), len(snap.my_board.marks)
+    print(f"{snap.grid_size}x{snap.grid_size} {snap.fleet} vs {snap.peer or 'unknown'}: "
+          f"{snap.turn} next, {fired} shots fired, {received} received, "
+          f"{os.path.getsize(path)} bytes, loaded in {elapsed * 1000:.2f} ms")
@@ -0,0 +1,190 @@
+# tournament.py
+# Round-robin tournament between the registered AI players, on the headless
+# rules in engine.py. Every pairing plays GAMES games (first player alternating)
+# in chunks spread over a process pool. Each chunk is folded into the standings
+# as soon as it finishes, and the standings plus the list of finished chunks
+# are checkpointed to a JSON file, so a long run can be stopped and resumed.
+#
+#   python3 tournament.py [games per pairing] [checkpoint.json] [players, e.g. random,density]
+
+import os
+import sys
+import json
+import time
+import random
+from itertools import combinations
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from engine import RandomPlayer, play_match
+from ai import HuntPlayer, DensityPlayer, EndgamePlayer
+from endgame import ENDGAME_NODES
+from placements import get_index
+from opening_book import get_book
+
+GRID_SIZE = 5
+SHIPS_TO_PLACE = [3, 2]
+
+GAMES = 1000
+CHUNK_GAMES = 50           # games per pool job; small enough to keep every core busy to the end
+JOBS_PER_WORKER = 2        # jobs kept queued per worker so none idles between results
+CHECKPOINT_INTERVAL = 5.0  # seconds between checkpoint writes
+REPORT_INTERVAL = 2.0      # seconds between standings printouts
+
+# name -> Player class (or factory). Anything registered here takes part in the
+# round robin. The endgame solver runs on a work budget, not a clock, so a
+# seeded chunk plays out the same on any machine.
+PLAYERS = {
+    "random": RandomPlayer,
+    "hunt": HuntPlayer,
+    "density": DensityPlayer,
+    "endgame": partial(EndgamePlayer, nodes=ENDGAME_NODES),
+}
+
+def play_chunk(a, b, grid_size, fleet, seed, first_game, games):
+    """Worker: play games between PLAYERS[a] and PLAYERS[b], alternating who
+    shoots first. Returns (wins, winning-turn totals), each indexed [a, b]."""
+    rng = random.Random(seed)
+    players = [PLAYERS[a](), PLAYERS[b]()]
+    wins, turns = [0, 0], [0, 0]
+    for g in range(first_game, first_game + games):
+        result = play_match(players, grid_size, fleet, rng=rng, first=g % 2)
+        wins[result["winner"]] += 1
+        turns[result["winner"]] += result["turns"]
+    return wins, turns
+
+class Standings:
+    """Win / turn totals per player and per pairing, updated one chunk at a time"""
+
+    def __init__(self, names):
+        self.players = {n: {"games": 0, "wins": 0, "win_turns": 0} for n in names}
+        self.pairs = {}
+
+    def add(self, a, b, wins, turns):
+        for name, other, w, t in ((a, b, wins[0], turns[0]), (b, a, wins[1], turns[1])):
+            row = self.players[name]
+            row["games"] += sum(wins)
+            row["wins"] += w
+            row["win_turns"] += t
+        pair = self.pairs.setdefault(f"{a}:{b}", [0, 0])
+        pair[0] += wins[0]
+        pair[1] += wins[1]
+
+    def to_json(self):
+        return {"players": self.players, "pairs": self.pairs}
+
+    @classmethod
+    def from_json(cls, data):
+        standings = cls(data["players"])
+        standings.players = data["players"]
+        standings.pairs = data["pairs"]
+        return standings
+
+    def table(self):
+        rows = sorted(self.players.items(), key=lambda kv: -kv[1]["wins"] / max(kv[1]["games"], 1))
+        lines = [f"{'player':<10} {'games':>7} {'win rate':>9} {'avg win turn':>13}"]
+        for name, row in rows:
+            rate = row["wins"] / max(row["games"], 1)
+            lines.append(f"{name:<10} {row['games']:>7} {rate:>9.1%} {row['win_turns'] / max(row['wins'], 1):>13.2f}")
+        for pair, (wa, wb) in sorted(self.pairs.items()):
+            a, b = pair.split(":")
+            lines.append(f"  {a} vs {b}: {wa}-{wb}")
+        return "\n".join(lines)
+
+class Tournament:
+    def __init__(self, names=None, games=GAMES, grid_size=GRID_SIZE, fleet=SHIPS_TO_PLACE,
+                 checkpoint=None, seed=0, workers=None):
+        self.names = list(names or PLAYERS)
+        unknown = [n for n in self.names if n not in PLAYERS]
+        if unknown: raise ValueError(f"unregistered players {unknown}, expected some of {list(PLAYERS)}")
+        self.games = games
+        self.grid_size = grid_size
+        self.fleet = list(fleet)
+        self.checkpoint = checkpoint
+        self.seed = seed
+        self.workers = workers or os.cpu_count() or 1
+        self.standings = Standings(self.names)
+        self.done = set()  # "a:b:chunk" for every chunk already folded into the standings
+        if checkpoint and os.path.exists(checkpoint):
+            self._resume()
+
+    def _config(self):
+        return {"players": self.names, "games": self.games, "grid_size": self.grid_size,
+                "fleet": self.fleet, "seed": self.seed}
+
+    def _resume(self):
+        with open(self.checkpoint) as f:
+            data = json.load(f)
+        if data["config"] != self._config():
+            raise ValueError(f"{self.checkpoint} was written for {data['config']}, not {self._config()}")
+        self.standings = Standings.from_json(data["standings"])
+        self.done = set(data["done"])
+
+    def save(self):
+        if not self.checkpoint: return
+        data = {"config": self._config(), "standings": self.standings.to_json(), "done": sorted(self.done)}
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint)
+
+    def jobs(self):
+        """(a, b, chunk, first_game, games) for every chunk not yet played"""
+        for a, b in combinations(self.names, 2):
+            for chunk, first_game in enumerate(range(0, self.games, CHUNK_GAMES)):
+                if f"{a}:{b}:{chunk}" in self.done: continue
+                yield a, b, chunk, first_game, min(CHUNK_GAMES, self.games - first_game)
+
+    def run(self, report=print):
+        """Play every outstanding chunk. Standings are updated (and periodically
+        reported and checkpointed) as chunks finish, in whatever order they do."""
+        get_index(self.grid_size, self.fleet)  # build the disk caches once, before workers map them
+        get_book(self.grid_size, self.fleet)
+        todo = self.jobs()
+        last_save = last_report = time.monotonic()
+        with ProcessPoolExecutor(self.workers) as pool:
+            def submit(job):
+                a, b, chunk, first_game, games = job
+                seed = f"{self.seed}:{a}:{b}:{chunk}"
+                return pool.submit(play_chunk, a, b, self.grid_size, self.fleet, seed, first_game, games)
+
+            running = {}
+            def top_up():
+                for job in todo:
+                    running[submit(job)] = job
+                    if len(running) >= self.workers * JOBS_PER_WORKER: break
+            top_up()
+            try:
+                while running:
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for f in finished:
+                        a, b, chunk, _, _ = running.pop(f)
+                        wins, turns = f.result()
+                        self.standings.add(a, b, wins, turns)
+                        self.done.add(f"{a}:{b}:{chunk}")
+                    top_up()
+                    now = time.monotonic()
+                    if now - last_save >= CHECKPOINT_INTERVAL:
+                        self.save()
+                        last_save = now
+                    if report and now - last_report >= REPORT_INTERVAL:
+                        report(self.standings.table())
+                        last_report = now
+            finally:
+                for f in running: f.cancel()
+                self.save()
+        return self.standings
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else GAMES
+    checkpoint = sys.argv[2] if len(sys.argv) > 2 else None
+    names = sys.argv[3].split(",") if len(sys.argv) > 3 else None
+    tournament = Tournament(names, games, checkpoint=checkpoint)
+    start = time.perf_counter()
+    standings = tournament.run()
+    elapsed = time.perf_counter() - start
+    played = sum(row["games"] for row in standings.players.values()) // 2
+    print(standings.table())
+    print(f"{played} games on {tournament.workers} workers in {elapsed:.2f}s")